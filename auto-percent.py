@@ -1,19 +1,42 @@
-from decimal import Decimal
-import decimal
+"""
+Turns the raw word counts in counts_un.txt ("word<tab>count", most common first) into new_counts.txt, the
+word_counts.txt format: each count as a share of the first one.
 
-popularity = open('counts_un.txt')
+    python auto-percent.py --output word_counts.txt --build
 
-word_popularity = []
-for i in popularity.readlines():
-    word_popularity.append((i.split("\t")[0], int(i.split("\t")[1].strip("\n"))))
+The counts are read and written in one streaming pass. Each share is written already snapped to the 16 bit log scale
+the dictionary keeps popularity in (dictionary.popularity_code()), so the text says exactly what ends up in the
+table. --build then rebuilds dictionary.bin, where that table sits aligned to the word ids, with words that have no
+count filled in with the lowest.
+"""
+import argparse
 
-a = float(word_popularity[0][1])
-better_listypoo = {}
-for i in word_popularity:
-    better_listypoo[i[0]] = i[1] / a
+from dictionary import POPULARITY, build_artifact, popularity_code, read_lines
 
-output = open('new_counts.txt', 'w')
-for i in better_listypoo:
-    output.write(i + " " + str(better_listypoo[i]) + "\n")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalises raw word counts into the word_counts.txt format.")
+    parser.add_argument("--counts", default="counts_un.txt")
+    parser.add_argument("--output", default="new_counts.txt")
+    parser.add_argument("--build", action="store_true", help="rebuild dictionary.bin afterwards")
+    args = parser.parse_args()
 
-output.close()
\ No newline at end of file
+    top = None
+    written = 0
+    with open(args.output, "w") as output:
+        for lines in read_lines(args.counts):
+            out = []
+            for line in lines:
+                word, _, count = line.partition("\t")
+                try:
+                    count = int(count)
+                except ValueError:
+                    continue
+                if top is None:
+                    top = float(count)
+                out.append("{} {!r}\n".format(word, POPULARITY[popularity_code(count / top)]))
+            output.writelines(out)
+            written += len(out)
+    print("- Wrote {} counts to {}".format(written, args.output))
+
+    if args.build:
+        print("- Wrote", build_artifact())
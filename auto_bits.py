@@ -1,54 +1,139 @@
-content = [x.strip("\n") for x in open('words.txt').readlines()]
-bits = {}
+"""
+Mines the common prefixes and suffixes ("bits") of words.txt into new_cbit.txt, in the common_bits.txt format:
+"+gr" for a prefix, "-le" for a suffix.
 
-total = float(len(content))
+    python auto_bits.py --lengths 7- --jobs 0 --stats bit_stats.json
+
+Every word of a mined length counts its prefix and suffix of each size from --min to --max once, and bits found in at
+least --threshold of all the words are kept. The word list is read in chunks that can be counted in parallel.
+--stats writes the same counts per word length (the share of that length's words each bit is in) for tuning the bits
+to particular lengths.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+from collections import Counter
+from operator import itemgetter
+
+from dictionary import read_lines
 
-MAX_L = 4
 MIN_L = 2
-print total
-for idfg, word in enumerate(content):
-    if len(word) < 7:
-        continue
-    for bit in bits:
-        bit_d = bits[bit]
-        if not bit_d[0]:
-            if word.startswith(bit):
-                bits[bit][1] += 1
-        else:
-            if word.endswith(bit):
-                bits[bit][1] += 1
-    for i in range(MIN_L, MAX_L+1):
-        test_bit = word[-i:]
-        if test_bit in bits:
-            continue
-        else:
-            bits[test_bit] = [True, 1]
-        test_bit = word[:i]
-        if test_bit in bits:
+MAX_L = 4
+THRESH = 0.0025
+
+
+def count_bits(lines, low=MIN_L, high=MAX_L, lengths=(7, None)):
+    """
+    Counts one chunk of words: returns how many words there were by length, and for each word length within
+    lengths a Counter of its prefixes and one of its suffixes.
+    """
+    shortest, longest = lengths
+    by_length = {}
+    for word in lines:
+        word = word.strip()
+        if word:
+            by_length.setdefault(len(word), []).append(word)
+
+    words = Counter(dict((length, len(group)) for length, group in by_length.items()))
+    found = {}
+    for length, group in by_length.items():
+        if length < shortest or (longest is not None and length > longest):
             continue
-        else:
-            bits[test_bit] = [False, 1]
-    if idfg % 150 == 0:
-        print idfg
-    if idfg % 15000 == 0:
-        r = []
-        for bit in bits:
-            if bits[bit][1] < 700:
-                r.append(bit)
-        for i in r:
-            del bits[i]
+        prefixes = Counter()
+        suffixes = Counter()
+        for k in range(low, min(high, length) + 1):
+            # slicing with itemgetter keeps the whole count in C
+            prefixes.update(map(itemgetter(slice(None, k)), group))
+            suffixes.update(map(itemgetter(slice(-k, None)), group))
+        found[length] = (prefixes, suffixes)
+    return words, found
 
-THRESH = 0.0025
-final_bits = {}
-for i in bits:
-    percent = bits[i][1] / total
-    if percent >= THRESH:
-        final_bits[i] = bits[i]
-out = open('new_cbit.txt', 'w')
-for bit in final_bits:
-    if final_bits[bit][0]:
-        out.write("-")
+
+def _count_chunk(args):
+    return count_bits(*args)
+
+
+def mine(path, low=MIN_L, high=MAX_L, lengths=(7, None), jobs=1):
+    """Counts every chunk of the word list at path, over jobs processes, and adds the counts up."""
+    chunks = ((lines, low, high, lengths) for lines in read_lines(path))
+    words = Counter()
+    found = {}
+    if jobs == 1:
+        counted = map(_count_chunk, chunks)
     else:
-        out.write("+")
-    out.write(bit + "\n")
-out.close()
\ No newline at end of file
+        pool = multiprocessing.Pool(jobs)
+        counted = pool.imap_unordered(_count_chunk, chunks)
+    for chunk_words, chunk_found in counted:
+        words.update(chunk_words)
+        for length, (prefixes, suffixes) in chunk_found.items():
+            if length in found:
+                found[length][0].update(prefixes)
+                found[length][1].update(suffixes)
+            else:
+                found[length] = (prefixes, suffixes)
+    if jobs != 1:
+        pool.close()
+        pool.join()
+    return words, found
+
+
+def _bits(found):
+    """(length, is suffix, bit, count) for every bit counted."""
+    for length, (prefixes, suffixes) in found.items():
+        for suffix, counts in ((False, prefixes), (True, suffixes)):
+            for bit, count in counts.items():
+                yield length, suffix, bit, count
+
+
+def common_bits(words, found, threshold=THRESH):
+    """The bits in at least threshold of all the words, as (is suffix, bit, count), most common first."""
+    totals = Counter()
+    for length, suffix, bit, count in _bits(found):
+        totals[suffix, bit] += count
+    total = float(sum(words.values()))
+    kept = [(suffix, bit, count) for (suffix, bit), count in totals.items() if count / total >= threshold]
+    return sorted(kept, key=lambda b: (-b[2], b[0], b[1]))
+
+
+def length_stats(words, found, threshold=THRESH):
+    """For each mined word length, its number of words and the share of them each bit above threshold is in."""
+    stats = {}
+    for length, suffix, bit, count in _bits(found):
+        share = count / float(words[length])
+        if share >= threshold:
+            stats.setdefault(length, {})[("-" if suffix else "+") + bit] = share
+    return dict((str(length), {"words": words[length],
+                               "bits": dict(sorted(bits.items(), key=lambda b: (-b[1], b[0])))})
+                for length, bits in sorted(stats.items()))
+
+
+def parse_range(text):
+    """"7-" or "7-12" or "9" as (shortest, longest), with None for no upper bound."""
+    low, dash, high = text.partition("-")
+    if not dash:
+        return int(low), int(low)
+    return int(low or 1), int(high) if high else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mines common prefixes and suffixes from a word list.")
+    parser.add_argument("--words", default="words.txt")
+    parser.add_argument("--output", default="new_cbit.txt")
+    parser.add_argument("--lengths", default="7-", help="word lengths to mine bits from, e.g. 7- or 5-9")
+    parser.add_argument("--min", type=int, default=MIN_L, help="shortest bit")
+    parser.add_argument("--max", type=int, default=MAX_L, help="longest bit")
+    parser.add_argument("--threshold", type=float, default=THRESH, help="share of all words a bit has to be in")
+    parser.add_argument("--jobs", type=int, default=1, help="processes to count in (0 for one per core)")
+    parser.add_argument("--stats", help="also write per word length bit statistics here, as JSON")
+    args = parser.parse_args()
+
+    words, found = mine(args.words, args.min, args.max, parse_range(args.lengths), args.jobs or os.cpu_count() or 1)
+    bits = common_bits(words, found, args.threshold)
+    with open(args.output, "w") as out:
+        for suffix, bit, count in bits:
+            out.write(("-" if suffix else "+") + bit + "\n")
+    print("- Wrote {} bits from {} words to {}".format(len(bits), sum(words.values()), args.output))
+    if args.stats:
+        with open(args.stats, "w") as out:
+            json.dump(length_stats(words, found, args.threshold), out, indent=2)
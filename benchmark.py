@@ -0,0 +1,261 @@
+"""
+Plays the solver against words from its own dictionary and reports how it did, as JSON.
+
+    python benchmark.py --lengths 5-10 --sample 200 --jobs 0 --output bench.json
+
+For every length it reports the win rate (found with at most 6 misses, i.e. before remaining = 7 runs out), how many
+wrong guesses games took, per-turn latency percentiles and games per second, so changes can be compared on both
+accuracy and speed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+from dictionary import load_dictionary
+from engine import Game, default_backend, default_strategy
+from transposition import TranspositionTable
+
+MAX_WRONGS = 6
+# a game that hasn't finished after this many guesses has got stuck re-guessing
+MAX_GUESSES = 26
+
+# what each worker process plays with, set up before the pool forks so the dictionary is shared rather than reloaded
+_worker = {}
+
+
+def reveal(word, letters):
+    return ["." if c not in letters else c for c in word]
+
+
+def play(dictionary, word, backend=default_backend, book=None, table=None, strategy=default_strategy):
+    """Plays one game against word, returning a dict describing how it went."""
+    game = Game(dictionary, len(word), backend=backend, book=book, table=table, strategy=strategy)
+    letters = set()
+    turns = []
+    error = None
+    while True:
+        start = time.perf_counter()
+        try:
+            guess = game.turn()
+        except (ValueError, ZeroDivisionError) as e:
+            # the word isn't reachable any more: no predictions left or no words left
+            error = type(e).__name__
+            break
+        finally:
+            turns.append(time.perf_counter() - start)
+        if guess is None:
+            break
+        if game.rights + game.wrongs >= MAX_GUESSES:
+            error = "stuck"
+            break
+        correct = guess.segment in word
+        if correct:
+            letters.update(guess.segment)
+        game.apply_feedback(guess, correct, reveal(word, letters))
+    game.close()
+
+    return {
+        "word": word,
+        "length": len(word),
+        "rights": game.rights,
+        "wrongs": game.wrongs,
+        "won": error is None and game.wrongs <= MAX_WRONGS,
+        "error": error,
+        "turns": turns,
+    }
+
+
+def warm(dictionary, lengths, backend):
+    """Builds the per-length indexes up front, so forked workers share them instead of each building their own."""
+    for length in lengths:
+        if length not in dictionary.words_by_length:
+            continue
+        if backend == "bitset":
+            dictionary.index(length)
+        elif backend == "numpy":
+            dictionary.matrix(length)
+        elif backend == "native":
+            dictionary.native(length)
+        else:
+            # what check_words reads: the words, their decoded popularity and its whole units
+            dictionary.words_by_length[length]
+            dictionary.popularity(length)
+            dictionary.units(length)
+
+
+def _init_worker(directory, backend, book, table, strategy):
+    if "dictionary" not in _worker:
+        # no fork on this platform, so each worker maps the dictionary itself (dictionary.bin pages are still shared)
+        _worker["dictionary"] = load_dictionary(directory, verbose=False)
+    _worker["backend"] = backend
+    _worker["book"] = book
+    _worker["table"] = table
+    _worker["strategy"] = strategy
+
+
+def _play_shard(shard):
+    return [(i, play(_worker["dictionary"], word, _worker["backend"], _worker["book"], _worker["table"],
+                     _worker["strategy"])) for i, word in shard]
+
+
+def play_all(dictionary, words, backend=default_backend, jobs=1, directory=".", book=None, table=None,
+             strategy=default_strategy):
+    """
+    Plays every word, sharded over jobs processes (like the OpenMP loop in hang.cpp), returning results in order.
+    """
+    if jobs == 1:
+        return [play(dictionary, word, backend, book, table, strategy) for word in words]
+
+    # small shards handed out as workers free up keep them evenly loaded, even though long words are slower to play
+    numbered = list(enumerate(words))
+    shards = [numbered[i:i + 4] for i in range(0, len(numbered), 4)]
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        _worker["dictionary"] = dictionary
+    else:
+        context = multiprocessing.get_context()
+    results = [None] * len(words)
+    try:
+        with context.Pool(jobs, initializer=_init_worker, initargs=(directory, backend, book, table, strategy)) as pool:
+            for shard in pool.imap_unordered(_play_shard, shards):
+                for i, result in shard:
+                    results[i] = result
+    finally:
+        _worker.clear()
+    return results
+
+
+def parse_lengths(text):
+    lengths = []
+    for part in text.split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            lengths.extend(range(int(low), int(high) + 1))
+        else:
+            lengths.append(int(part))
+    return lengths
+
+
+def pick_words(dictionary, lengths, sample, seed):
+    """sample distinct words of each length (all of them if sample is 0), in a repeatable order."""
+    rng = random.Random(seed)
+    picked = []
+    for length in lengths:
+        words = sorted(set(dictionary.words_by_length.get(length, [])))
+        if sample and sample < len(words):
+            words = rng.sample(words, sample)
+        picked.extend(words)
+    return picked
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(p / 100.0 * len(ordered)))]
+
+
+def summarise(results, elapsed):
+    turns = sorted(t for r in results for t in r["turns"])
+    wrongs = {}
+    for r in results:
+        if r["error"] is None:
+            wrongs[r["wrongs"]] = wrongs.get(r["wrongs"], 0) + 1
+    games = len(results)
+    return {
+        "games": games,
+        "wins": sum(r["won"] for r in results),
+        "win_rate": sum(r["won"] for r in results) / float(games) if games else None,
+        "errors": sum(r["error"] is not None for r in results),
+        "mean_wrongs": sum(r["wrongs"] for r in results) / float(games) if games else None,
+        "wrong_distribution": dict((str(k), wrongs[k]) for k in sorted(wrongs)),
+        "turn_ms": {
+            "p50": _ms(percentile(turns, 50)),
+            "p90": _ms(percentile(turns, 90)),
+            "p99": _ms(percentile(turns, 99)),
+            "max": _ms(turns[-1] if turns else None),
+        },
+        "seconds": elapsed,
+        "words_per_second": games / elapsed if elapsed else None,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else seconds * 1000.0
+
+
+def report(results, elapsed, options, load_times=None):
+    by_length = {}
+    for r in results:
+        by_length.setdefault(r["length"], []).append(r)
+    cpu = sum(t for r in results for t in r["turns"])
+    lengths = {}
+    for l in sorted(by_length):
+        # per length the wall clock time is the time spent in that length's turns
+        lengths[str(l)] = summarise(by_length[l], sum(t for r in by_length[l] for t in r["turns"]))
+        if load_times and l in load_times:
+            # what the first game of the length waited for before its first turn: loading its words and index
+            lengths[str(l)]["load_ms"] = load_times[l][0]
+    return {
+        "options": options,
+        "overall": summarise(results, elapsed),
+        "lengths": lengths,
+        "turn_seconds": cpu,
+        "failures": [{"word": r["word"], "wrongs": r["wrongs"], "error": r["error"]} for r in results if not r["won"]],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Plays the solver against the dictionary and reports JSON results.")
+    parser.add_argument("--lengths", default="5-10", help="word lengths to play, e.g. 5-10 or 4,6,8")
+    parser.add_argument("--sample", type=int, default=100, help="words per length (0 for every word)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default=default_backend)
+    parser.add_argument("--strategy", default=default_strategy, choices=["weight", "entropy"])
+    parser.add_argument("--jobs", type=int, default=1, help="worker processes to play in (0 for one per core)")
+    parser.add_argument("--directory", default=".", help="where the dictionary files are")
+    parser.add_argument("--book", help="opening book to play from (see book.py)")
+    parser.add_argument("--table", action="store_true", help="share a transposition table between games")
+    parser.add_argument("--table-store", help="SQLite file to keep the transposition table in (implies --table)")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    jobs = args.jobs or os.cpu_count() or 1
+    lengths = parse_lengths(args.lengths)
+
+    dictionary = load_dictionary(args.directory, verbose=False)
+    words = pick_words(dictionary, lengths, args.sample, args.seed)
+    book = None
+    if args.book:
+        from book import OpeningBook  # book.py builds on play's helpers, so it imports this module
+        book = OpeningBook.load(args.book, dictionary, args.strategy)
+        if book is None:
+            parser.error("{} is missing or was built from a different dictionary or strategy".format(args.book))
+    table = None
+    if args.table or args.table_store:
+        table = TranspositionTable(dictionary.fingerprint, args.strategy, path=args.table_store)
+    if jobs > 1:
+        warm(dictionary, lengths, args.backend)
+
+    start = time.perf_counter()
+    results = play_all(dictionary, words, args.backend, jobs, args.directory, book, table, args.strategy)
+    elapsed = time.perf_counter() - start
+
+    options = {"lengths": args.lengths, "sample": args.sample, "seed": args.seed, "backend": args.backend,
+               "strategy": args.strategy,
+               "jobs": jobs, "book": args.book,
+               "table": args.table_store or bool(args.table)}
+    text = json.dumps(report(results, elapsed, options, dictionary.load_times), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
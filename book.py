@@ -0,0 +1,148 @@
+"""
+An opening book: the engine's guesses for the first few plies of every length, worked out offline.
+
+For a fresh game the first guesses only depend on the length and on how the earlier guesses went, so they can be
+looked up instead of recomputed. Build one with
+
+    python book.py build --lengths 4-12 --plies 4
+
+and pass it to Game(book=...). Positions past the book are what the transposition table (transposition.py) is for.
+"""
+import argparse
+import copy
+import json
+import os
+import time
+
+from benchmark import parse_lengths, reveal
+from dictionary import load_dictionary
+from engine import Game, default_backend, default_strategy
+
+BOOK = "opening_book.json"
+
+
+def encode_key(key):
+    return "{}|{}|{}".format(*key)
+
+
+def decode_key(text):
+    length, board, missed = text.split("|")
+    return int(length), board, missed
+
+
+class OpeningBook(object):
+    """Guesses by Game.state_key() for every position in the first plies guesses."""
+
+    def __init__(self, fingerprint=None, plies=0, entries=None, strategy=default_strategy):
+        self.fingerprint = fingerprint
+        self.strategy = strategy
+        self.plies = plies
+        self.entries = entries if entries is not None else {}
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, key):
+        guess = self.entries.get(key)
+        if guess is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return guess
+
+    def save(self, path):
+        data = {
+            "fingerprint": self.fingerprint,
+            "plies": self.plies,
+            "strategy": self.strategy,
+            "entries": dict((encode_key(k), v) for k, v in self.entries.items()),
+        }
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path, dictionary, strategy=default_strategy):
+        """
+        Reads a saved book, or returns None if there isn't one or it was built against another dictionary or for
+        another strategy.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("fingerprint") != dictionary.fingerprint or data.get("strategy", "weight") != strategy:
+            return None
+        return cls(data["fingerprint"], data["plies"], dict((decode_key(k), v) for k, v in data["entries"].items()),
+                   strategy)
+
+
+def _fork(game):
+    """A copy of a game to play on from, sharing the dictionary and its index rather than copying them."""
+    memo = dict((id(x), x) for x in (game.dictionary, game.progress, game.book, game.table, game.profile))
+    for shared in ("index", "native"):
+        if hasattr(game, shared):
+            memo[id(getattr(game, shared))] = getattr(game, shared)
+    return copy.deepcopy(game, memo)
+
+
+def build_book(dictionary, lengths, plies, backend=default_backend, strategy=default_strategy, verbose=True):
+    """
+    Plays the engine through every position the dictionary's words can lead to in the first plies guesses.
+
+    Rather than playing each word separately, the words are split by what the board would show after each guess,
+    and each group carries on from a copy of the same game.
+    """
+    book = OpeningBook(dictionary.fingerprint, plies, strategy=strategy)
+    for length in lengths:
+        words = sorted(set(dictionary.words_by_length.get(length, [])))
+        if not words:
+            continue
+        start = time.time()
+        pending = [(Game(dictionary, length, backend=backend, strategy=strategy), frozenset(), words)]
+        while pending:
+            game, letters, group = pending.pop()
+            try:
+                guess = game.turn()
+            except (ValueError, ZeroDivisionError):
+                guess = None
+            if guess is None:
+                game.close()
+                continue
+            book.entries[game.state_key()] = guess.segment
+            if game.rights + game.wrongs + 1 >= plies:
+                game.close()
+                continue
+
+            outcomes = {}
+            for word in group:
+                hit = guess.segment in word
+                board = "".join(reveal(word, letters | set(guess.segment) if hit else letters))
+                outcomes.setdefault((hit, board), []).append(word)
+            for (hit, board), words_left in outcomes.items():
+                following = _fork(game)
+                following.apply_feedback(following.prediction_index.get(guess.key()), hit, board)
+                pending.append((following, letters | set(guess.segment) if hit else letters, words_left))
+            game.close()
+        if verbose:
+            print("- Length {}: {} positions in {:.1f}s".format(
+                length, sum(1 for k in book.entries if k[0] == length), time.time() - start))
+    return book
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds the opening book of first guesses per word length.")
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("--lengths", default="4-12")
+    parser.add_argument("--plies", type=int, default=4, help="how many guesses deep to go")
+    parser.add_argument("--backend", default=default_backend)
+    parser.add_argument("--strategy", default=default_strategy, choices=["weight", "entropy"])
+    parser.add_argument("--directory", default=".", help="where the dictionary files are")
+    parser.add_argument("--output", help="defaults to {} in the dictionary directory".format(BOOK))
+    args = parser.parse_args()
+
+    dictionary = load_dictionary(args.directory, verbose=False)
+    book = build_book(dictionary, parse_lengths(args.lengths), args.plies, args.backend, args.strategy)
+    output = args.output or os.path.join(args.directory, BOOK)
+    book.save(output)
+    print("- Wrote {} positions to {}".format(len(book.entries), output))
@@ -0,0 +1,467 @@
+import argparse
+import collections.abc
+import hashlib
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from functools import partial
+
+from index import LRUCache, WordIndex, quantize
+from matrix import WordMatrix
+from native import NativeWords
+
+enable_va = os.getenv("WEIGHT_USAGE", "1")
+enable_va = int(enable_va) == 1
+
+# the precompiled dictionary written by "python dictionary.py build", and the files it is built from
+ARTIFACT = "dictionary.bin"
+SOURCES = ("word_counts.txt", "words.txt", "common_bits.txt")
+MAGIC = b"HANGDICT"
+# bumped whenever the words loaded from the same files change, so older artifacts and the caches keyed by fingerprint
+# get rebuilt
+VERSION = 3
+# how much of a word list is read in one go
+CHUNK = 1 << 20
+# how many word lengths keep their words and indexes loaded; a length dropped from the cache is loaded again (from
+# dictionary.bin's mapping, for a MappedDictionary) when a game of it next starts
+SHARDS = int(os.getenv("SOLVER_SHARDS", "8"))
+
+# popularity is kept as 16 bit codes on a log scale, OCTAVE codes to each doubling: code c stands for
+# 2 ** ((c - ONE) / OCTAVE), from about 2 ** -48 up to 2 ** 16, and code 0 for no popularity at all
+POPULARITY_BITS = 16
+OCTAVE = 1024
+ONE = 48 * OCTAVE
+
+
+def popularity_code(value):
+    if value <= 0:
+        return 0
+    return min((1 << POPULARITY_BITS) - 1, max(1, ONE + int(round(math.log2(value) * OCTAVE))))
+
+
+# the popularity each code stands for
+POPULARITY = array("d", [0.0] + [2.0 ** ((c - ONE) / float(OCTAVE)) for c in range(1, 1 << POPULARITY_BITS)])
+
+
+class Shard(object):
+    """
+    Whatever has been loaded or built for one word length (its words, the word -> popularity lookup and the index,
+    matrix or native words the backends asked for), with how long each part took the first time in load_ms.
+    """
+
+    def __init__(self, length):
+        self.length = length
+        self.parts = {}
+        self.load_ms = {}
+
+    def get(self, name, build):
+        if name not in self.parts:
+            start = time.perf_counter()
+            self.parts[name] = build()
+            self.load_ms[name] = (time.perf_counter() - start) * 1000.0
+        return self.parts[name]
+
+
+class Dictionary(object):
+    """The loaded word lists: words split by length, their popularity and the common prefix/suffix bits."""
+
+    def __init__(self, words_by_length, word_popularity, bits, fingerprint=None):
+        self.words_by_length = words_by_length
+        self.word_popularity = word_popularity
+        self.bits = bits
+        # identifies the source files (and WEIGHT_USAGE) this was loaded from, so caches of results can tell when
+        # they were made against a different dictionary
+        self.fingerprint = fingerprint
+        self.shards = LRUCache(SHARDS)
+        # load_ms of every shard loaded so far, by length, including ones since dropped from the cache
+        self.load_times = {}
+        # the worker processes checking its words (parallel.CheckPool), once they have been started
+        self.check_pool = None
+
+    def shard(self, length):
+        if length in self.shards:
+            return self.shards[length]
+        shard = self.shards[length] = Shard(length)
+        self.load_times.setdefault(length, []).append(shard.load_ms)
+        return shard
+
+    def popularity(self, length):
+        """The popularity of each word in words_by_length[length], in the same order."""
+        return [self.word_popularity[w] for w in self.words_by_length[length]]
+
+    def units(self, length):
+        """popularity(length) quantize()d: how much popularity a unit is, and each word's popularity in units."""
+        def build():
+            unit, units = quantize(self.popularity(length))
+            return unit, array("q", units)
+        return self.shard(length).get("units", build)
+
+    def word_block(self, length):
+        """words_by_length[length] as one run of bytes, length bytes per word."""
+        return "".join(self.words_by_length[length]).encode("latin-1", "replace")
+
+    def index(self, length):
+        """The WordIndex for one word length, built the first time a game of that length asks for it."""
+        return self.shard(length).get("index", lambda: WordIndex(self.words_by_length[length],
+                                                                 self.popularity(length)))
+
+    def matrix(self, length):
+        """The WordMatrix for one word length, for the numpy backend."""
+        return self.shard(length).get("matrix", lambda: WordMatrix(self.words_by_length[length],
+                                                                   self.popularity(length), self.word_block(length)))
+
+    def native(self, length):
+        """The NativeWords for one word length, for the native backend."""
+        return self.shard(length).get("native", lambda: NativeWords(self.words_by_length[length],
+                                                                    self.popularity(length), self.word_block(length)))
+
+
+class _PackedLengths(collections.abc.Mapping):
+    """words_by_length for a PackedDictionary: each length is only decoded into strings (in its shard) when used."""
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+
+    def __getitem__(self, length):
+        if length not in self.dictionary.lengths:
+            raise KeyError(length)
+        return self.dictionary.shard(length).get("words", partial(self.decode, length))
+
+    def decode(self, length):
+        block = bytes(self.dictionary.word_block(length)).decode("latin-1")
+        return [block[i:i + length] for i in range(0, len(block), length)]
+
+    def __contains__(self, length):
+        # without decoding the words
+        return length in self.dictionary.lengths
+
+    def __iter__(self):
+        return iter(self.dictionary.lengths)
+
+    def __len__(self):
+        return len(self.dictionary.lengths)
+
+
+class _PackedPopularity(collections.abc.Mapping):
+    """
+    word_popularity for a PackedDictionary: each length's lookup is built (in its shard) when one of its words is
+    first looked up, and words that aren't in the dictionary have the lowest popularity.
+    """
+
+    def __init__(self, dictionary):
+        self.dictionary = dictionary
+
+    def lookup(self, length):
+        dictionary = self.dictionary
+        return dictionary.shard(length).get("lookup", lambda: dict(zip(dictionary.words_by_length[length],
+                                                                       dictionary.popularity(length))))
+
+    def __getitem__(self, word):
+        if len(word) not in self.dictionary.lengths:
+            return self.dictionary.low
+        return self.lookup(len(word)).get(word, self.dictionary.low)
+
+    def __iter__(self):
+        for length in self.dictionary.lengths:
+            for word in self.lookup(length):
+                yield word
+
+    def __len__(self):
+        return sum(section["count"] for section in self.dictionary.lengths.values())
+
+
+class PackedDictionary(Dictionary):
+    """
+    A Dictionary that keeps each length's words as one run of fixed width latin-1 bytes and their popularity as an
+    array of 16 bit codes (popularity_code()), instead of a str (and a dict entry) per word. lengths has each
+    length's "count" of words, and words without a popularity have low, already filled in when they were packed.
+
+    The words and the word -> popularity lookup are only turned into Python objects a length at a time, when something
+    asks for that length, and are kept in its shard.
+    """
+
+    def __init__(self, lengths, blocks, codes, low, bits, fingerprint=None):
+        self.lengths = lengths
+        self.blocks = blocks
+        self.codes = codes
+        self.low = low
+        super(PackedDictionary, self).__init__(_PackedLengths(self), _PackedPopularity(self), bits, fingerprint)
+
+    def popularity(self, length):
+        # decoded into doubles once per shard, so scoring just indexes an array by word id
+        return self.shard(length).get("popularity", lambda: array("d", map(POPULARITY.__getitem__,
+                                                                             self.popularity_codes(length))))
+
+    def popularity_codes(self, length):
+        return self.codes[length]
+
+    def word_block(self, length):
+        return self.blocks[length]
+
+
+class MappedDictionary(PackedDictionary):
+    """
+    A PackedDictionary read straight out of a memory-mapped dictionary.bin, so worker processes share the same pages.
+    """
+
+    def __init__(self, mapping, header, data_start):
+        self.mapping = mapping
+        self.header = header
+        self.data_start = data_start
+        super(MappedDictionary, self).__init__(dict((int(l), section) for l, section in header["lengths"].items()),
+                                               None, None, header["low"], [tuple(b) for b in header["bits"]],
+                                               fingerprint(header["sources"]))
+
+    def _section(self, length, name, size):
+        start = self.data_start + self.lengths[length][name]
+        return memoryview(self.mapping)[start:start + size]
+
+    def popularity_codes(self, length):
+        return self._section(length, "popularity", 2 * self.lengths[length]["count"]).cast("H")
+
+    def word_block(self, length):
+        return self._section(length, "words", length * self.lengths[length]["count"])
+
+
+def load_bits(path):
+    bits = []
+    with open(path) as f:
+        for i in f.readlines():
+            bit = i[1:]
+            bit = bit.strip("\n")
+            suf = i[0] == "-"
+            bits.append((suf, bit))
+    return bits
+
+
+def read_lines(path, size=CHUNK):
+    """The lines of a text file, lowercased and in lists, reading about size characters at a time."""
+    with open(path) as f:
+        rest = ""
+        for data in iter(lambda: f.read(size), ""):
+            data = rest + data
+            cut = data.rfind("\n") + 1
+            rest = data[cut:]
+            if cut:
+                yield data[:cut].lower().splitlines()
+        if rest:
+            yield [rest.lower()]
+
+
+def load_text_dictionary(directory=".", verbose=True):
+    """
+    Streams word_counts.txt and then words.txt into a PackedDictionary, a chunk at a time.
+
+    Words are lowercased and kept if they look like words (no "-"), can be written in latin-1 and haven't been seen
+    yet; the first time a word is seen wins, so words with a count keep their popularity. Popularity is packed as a
+    popularity_code(), with words without a count given the lowest one there and then. Each word goes straight into
+    its length's byte run, so the only other copy while loading is the set used to spot repeats.
+    """
+    bits = load_bits(os.path.join(directory, 'common_bits.txt'))
+
+    blocks = {}
+    codes = {}
+    seen = {}
+    low = 2
+    skipped = 0
+
+    def pack(words, values):
+        """Adds words (each with its popularity from values), returning how many weren't words."""
+        bad = 0
+        from_bytes = int.from_bytes
+        for word, value in zip(words, values):
+            word = word.strip()
+            # only words starting with a lowercase letter and without hyphens
+            if not word or not "a" <= word[0] <= "z" or "-" in word:
+                bad += 1
+                continue
+            try:
+                encoded = word.encode("latin-1")
+            except UnicodeEncodeError:
+                bad += 1
+                continue
+            length = len(encoded)
+            lookup = seen.get(length)
+            if lookup is None:
+                blocks[length] = bytearray()
+                codes[length] = array("H")
+                lookup = seen[length] = set()
+            # as an int the word takes less room than as bytes, and within one length it's just as unique
+            key = from_bytes(encoded, "little")
+            if key in lookup:
+                continue
+            lookup.add(key)
+            blocks[length] += encoded
+            codes[length].append(popularity_code(value))
+        return bad
+
+    if verbose:
+        print("- Loading word dictionary...")
+    for lines in read_lines(os.path.join(directory, 'word_counts.txt')):
+        words = []
+        counts = []
+        for line in lines:
+            parts = line.split(" ")
+            try:
+                counts.append(float(parts[1]))
+            except (IndexError, ValueError):
+                skipped += 1
+                continue
+            words.append(parts[0])
+        if counts:
+            low = min(low, min(counts))
+        skipped += pack(words, counts if enable_va else itertools.repeat(1))
+    # every count has been read by now, so words without one can be given the lowest
+    for lines in read_lines(os.path.join(directory, 'words.txt')):
+        skipped += pack(lines, itertools.repeat(low))
+    del seen
+
+    if verbose:
+        print("  = {} words of {} lengths ({} lines skipped)".format(
+            sum(len(c) for c in codes.values()), len(blocks), skipped))
+        print("- Done loading word dictionary")
+
+    lengths = dict((length, {"count": len(codes[length])}) for length in blocks)
+    low = POPULARITY[popularity_code(low)]
+    return PackedDictionary(lengths, blocks, codes, low, bits, fingerprint(source_info(directory)))
+
+
+def load_dictionary(directory=".", verbose=True):
+    """Loads the dictionary, from dictionary.bin if it is there and up to date, otherwise from the text files."""
+    dictionary = open_artifact(directory)
+    if dictionary is not None:
+        return dictionary
+    if verbose:
+        print("- No up to date {} (run \"python dictionary.py build\" to make one)".format(ARTIFACT))
+    return load_text_dictionary(directory, verbose)
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_info(directory):
+    info = {}
+    for name in SOURCES:
+        path = os.path.join(directory, name)
+        st = os.stat(path)
+        info[name] = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha1": file_hash(path)}
+    return info
+
+
+def fingerprint(sources):
+    h = hashlib.sha1()
+    h.update("version={}\n".format(VERSION).encode("utf-8"))
+    for name in SOURCES:
+        h.update("{}={}\n".format(name, sources[name]["sha1"]).encode("utf-8"))
+    h.update("weight_usage={}\n".format(enable_va).encode("utf-8"))
+    return h.hexdigest()
+
+
+def sources_fresh(sources, directory):
+    """Whether the text files still match the ones an artifact was built from (only hashing when the stat differs)."""
+    for name in SOURCES:
+        path = os.path.join(directory, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        built = sources.get(name)
+        if built is None:
+            return False
+        if st.st_size == built["size"] and st.st_mtime_ns == built["mtime"]:
+            continue
+        if st.st_size != built["size"] or file_hash(path) != built["sha1"]:
+            return False
+    return True
+
+
+def build_artifact(directory=".", verbose=True):
+    """
+    Parses the text files once and writes dictionary.bin: a small JSON header (source hashes, bits, section offsets)
+    followed by, for every length, the words as fixed width bytes and their popularity as 16 bit codes.
+    """
+    dictionary = load_text_dictionary(directory, verbose)
+    header = {
+        "weight_usage": enable_va,
+        "byteorder": sys.byteorder,
+        "sources": source_info(directory),
+        "bits": dictionary.bits,
+        "low": dictionary.low,
+        "lengths": {},
+    }
+    sections = []
+    offset = 0
+    for length in sorted(dictionary.words_by_length):
+        words = dictionary.word_block(length)
+        popularity = array("H", dictionary.popularity_codes(length)).tobytes()
+        padding = b"\0" * (-len(words) % 8)
+        header["lengths"][length] = {"count": len(dictionary.words_by_length[length]), "words": offset,
+                                     "popularity": offset + len(words) + len(padding)}
+        sections.extend((words, padding, popularity))
+        offset += len(words) + len(padding) + len(popularity)
+
+    encoded = json.dumps(header).encode("utf-8")
+    start = len(MAGIC) + 8 + len(encoded)
+    encoded += b" " * (-start % 8)
+
+    path = os.path.join(directory, ARTIFACT)
+    with open(path + ".tmp", "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<II", VERSION, len(encoded)))
+        f.write(encoded)
+        for section in sections:
+            f.write(section)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def open_artifact(directory="."):
+    """Maps dictionary.bin as a MappedDictionary, or returns None if it is missing, damaged or out of date."""
+    path = os.path.join(directory, ARTIFACT)
+    try:
+        with open(path, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        # a truncated file can stop anywhere: in the magic, the sizes, the header or the sections
+        if len(mapping) < len(MAGIC) + 8 or mapping[:len(MAGIC)] != MAGIC:
+            return None
+        version, header_size = struct.unpack_from("<II", mapping, len(MAGIC))
+        if version != VERSION:
+            return None
+        data_start = len(MAGIC) + 8 + header_size
+        if len(mapping) < data_start:
+            return None
+        header = json.loads(mapping[len(MAGIC) + 8:data_start].decode("utf-8"))
+        if header["weight_usage"] != enable_va or header["byteorder"] != sys.byteorder:
+            return None
+        ends = [max(section["words"] + int(length) * section["count"], section["popularity"] + 2 * section["count"])
+                for length, section in header["lengths"].items()]
+        if len(mapping) < data_start + max(ends, default=0):
+            return None
+        if not sources_fresh(header["sources"], directory):
+            return None
+        return MappedDictionary(mapping, header, data_start)
+    except (struct.error, ValueError, KeyError):
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompiles the word lists into {}.".format(ARTIFACT))
+    parser.add_argument("command", choices=["build"])
+    parser.add_argument("directory", nargs="?", default=".")
+    args = parser.parse_args()
+
+    print("- Wrote", build_artifact(args.directory))
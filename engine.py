@@ -0,0 +1,935 @@
+import string
+import os
+from functools import partial
+from operator import attrgetter
+
+import native
+import parallel
+from index import popcount, reveal_pattern
+from letters import LetterStats
+from matrix import numpy
+from profiling import new_profiler
+from progress import Progress
+
+# "bitset" scores words with the masks from index.py, "numpy" with the matrices from matrix.py, "native" with hang.cpp
+# (native.py) and "python" is the original word by word loop
+default_backend = os.getenv("SOLVER_BACKEND", "bitset")
+# "weight" guesses the best weighted prediction (best()), "entropy" the letter that splits the words left best
+# (best_split())
+default_strategy = os.getenv("SOLVER_STRATEGY", "weight")
+
+
+class Prediction(object):
+    # a game makes thousands of these, so they keep their attributes in slots rather than a dict each
+    __slots__ = ("game", "childs", "parents", "roots", "weight", "true", "false", "number", "_mask")
+
+    def __init__(self, game):
+        self.game = game
+        self.childs = []
+        self.parents = []
+        self.roots = None
+        self.weight = 0
+        self.true = False
+        self.false = False
+        self.number = len(game.all_predictions_ever)
+        self._mask = None
+        game.all_predictions_ever.append(self)
+
+    # predictions whose mask can change (just the board) count this up when it does
+    revision = 0
+
+    def valid_for(self, word):
+        return True
+
+    def compile(self, index):
+        """The mask of words in index this prediction is valid for."""
+        return index.all
+
+    def mask(self, index):
+        if self._mask is None:
+            self.game.profile.count("masks_compiled")
+            self._mask = self.compile(index)
+        return self._mask
+
+    def depends_on(self, other):
+        pass
+
+    def possible_parents(self, index):
+        """The predictions in index that depends_on() could be true for; anything else can be skipped."""
+        return ()
+
+    def equals(self, other):
+        return False
+
+    def key(self):
+        """A hashable key that is the same for predictions that equals() each other."""
+        return ("blank", self.number)
+
+    def weight_scale(self):
+        return 1.0
+
+    def __eq__(self, other):
+        return self.equals(other)
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def falsify(self):
+        self.false = True
+        self.true = False
+        for child in self.childs:
+            self.game.all_predictions_ever[child].falsify()
+
+    def good(self):
+        return False
+
+    def notgood(self):
+        return False
+
+    def pretty(self):
+        return "Blank"
+
+
+class ContainsPrediction(Prediction):
+    __slots__ = ("segment",)
+
+    def __init__(self, game, segment):
+        super(ContainsPrediction, self).__init__(game)
+
+        self.segment = segment
+
+    def valid_for(self, word):
+        return self.segment in word
+
+    def compile(self, index):
+        return index.segment(self.segment)
+
+    def depends_on(self, other):
+        if type(other) == ContainsPrediction:
+            return other.segment in self.segment
+        return False
+
+    def possible_parents(self, index):
+        return index.segments(self.segment)
+
+    def key(self):
+        return ("contains", self.segment)
+
+    def equals(self, other):
+        if type(other) == ContainsPrediction:
+            return self.segment == other.segment
+        else:
+            return False
+
+    def weight_scale(self):
+        return 0.1 * len(self.segment) + 0.1
+
+    def good(self):
+        return self.segment in ''.join(self.game.status)
+
+    def __repr__(self):
+        return "CP: " + self.segment
+
+    def pretty(self):
+        return "Word contains {}".format(self.segment)
+
+
+class UsesBitPrediction(Prediction):
+    __slots__ = ("bit",)
+
+    def __init__(self, game, bit_):
+        super(UsesBitPrediction, self).__init__(game)
+        self.bit = bit_
+
+    def valid_for(self, word):
+        if self.bit[0]:
+            return word.endswith(self.bit[1])
+        else:
+            return word.startswith(self.bit[1])
+
+    def compile(self, index):
+        if self.bit[0]:
+            return index.suffix(self.bit[1])
+        else:
+            return index.prefix(self.bit[1])
+
+    def good(self):
+        return self.valid_for(''.join(self.game.status))
+
+    def depends_on(self, other):
+        if type(other) == ContainsPrediction:
+            return other.segment in self.bit[1]
+        return False
+
+    def possible_parents(self, index):
+        return index.segments(self.bit[1])
+
+    def key(self):
+        return ("bit", self.bit)
+
+    def equals(self, other):
+        if type(other) == UsesBitPrediction:
+            return other.bit == self.bit
+        return False
+
+    def weight_scale(self):
+        return 0.125 + 0.075*len(self.bit[1])
+
+    def pretty(self):
+        return "Word {} with {}".format("ends" if self.bit[0] else "starts", self.bit[1])
+
+
+class BoardPrediction(Prediction):
+    """
+    The current board as one constraint: revealed letters sit where they were revealed, and blanks can't be a
+    revealed letter or a missed one.
+
+    There is one of these per game, kept up to date with update(); bumping revision tells the mask backends its
+    mask changed.
+    """
+
+    __slots__ = ("plain", "excluded", "revision")
+
+    def __init__(self, game):
+        super(BoardPrediction, self).__init__(game)
+        self.revision = 0
+        self.plain = "." * game.length
+        self.excluded = frozenset()
+        self.true = True
+
+    def update(self, plain, missed):
+        excluded = frozenset(c for c in plain if c != ".") | frozenset(missed)
+        if plain == self.plain and excluded == self.excluded:
+            return
+        self.plain = plain
+        self.excluded = excluded
+        self.revision += 1
+        self._mask = None
+
+    def valid_for(self, word):
+        for w, c in zip(word, self.plain):
+            if c == ".":
+                if w in self.excluded:
+                    return False
+            elif w != c:
+                return False
+        return True
+
+    def compile(self, index):
+        return index.board(self.plain, self.excluded)
+
+    def good(self):
+        return True
+
+    def key(self):
+        return ("board",)
+
+    def equals(self, other):
+        return type(other) == BoardPrediction
+
+    def weight_scale(self):
+        return 0.15 * len(self.plain) - self.plain.count('.') + 0.2
+
+    def pretty(self):
+        return "Word matches {}".format(self.plain)
+
+
+class PredictionIndex(object):
+    """
+    A game's current predictions by key(), so add_prediction() can find a duplicate with one lookup and only has to
+    try depends_on() against predictions that could be parents.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.order = {}
+        self.added = 0
+
+    def add(self, p):
+        key = p.key()
+        if key in self.keys:
+            return
+        self.keys[key] = p
+        # where it sits in the predictions list, which decides the order parents are linked in
+        self.order[key] = self.added
+        self.added += 1
+
+    def discard(self, p):
+        key = p.key()
+        if self.keys.get(key) is p:
+            del self.keys[key]
+            del self.order[key]
+
+    def get(self, key):
+        return self.keys.get(key)
+
+    def segments(self, text):
+        """The ContainsPredictions whose segment appears somewhere in text."""
+        found = []
+        for start in range(len(text)):
+            for end in range(start + 1, len(text) + 1):
+                p = self.keys.get(("contains", text[start:end]))
+                if p is not None:
+                    found.append(p)
+        return found
+
+    def position(self, p):
+        return self.order[p.key()]
+
+
+class Game(object):
+    """
+    A single game of hangman against one word of a given length.
+
+    This is the whole solver without any interface attached: call turn() to get the next guess, then tell it how
+    the guess went with apply_feedback(). The board lives in status as a list of letters, with "." for blanks.
+    progress is a Progress (progress.py) or just a function, which hears how a turn is going a few times a second.
+    """
+
+    def __init__(self, dictionary, length, progress=None, backend=default_backend, book=None, table=None,
+                 strategy=default_strategy):
+        if backend not in ("bitset", "numpy", "native", "python"):
+            raise ValueError("unknown backend {}".format(backend))
+        if strategy not in ("weight", "entropy"):
+            raise ValueError("unknown strategy {}".format(strategy))
+        if backend == "numpy" and numpy is None:
+            raise RuntimeError("the numpy backend needs numpy installed")
+        if backend == "native" and native.lib is None:
+            # hang.cpp hasn't been built as a library; the bitset backend makes the same guesses
+            backend = "bitset"
+        if table is not None and table.fingerprint != dictionary.fingerprint:
+            raise ValueError("the transposition table was made for a different dictionary")
+        for cache in (book, table):
+            if cache is not None and cache.strategy != strategy:
+                raise ValueError("the {} was made with the {} strategy".format(type(cache).__name__, cache.strategy))
+        self.dictionary = dictionary
+        if not isinstance(progress, Progress):
+            # just a function to hear about progress through, or nothing
+            progress = Progress() if progress is None else Progress(progress)
+        self.progress = progress
+        self.backend = backend
+        self.strategy = strategy
+        self.book = book
+        self.table = table
+        # how many words were left when the last guess was picked
+        self.candidates = None
+        self.all_predictions_ever = []
+        self.predictions = []
+        self.prediction_index = PredictionIndex()
+        self.possible = []
+        self.possible_mask = 0
+        self.possible_ids = None
+        self.applied = {}
+        self.support = {}
+        self.support_weighted = None
+        self.stats = None
+        self._possible_weighted = {}
+        self._weighing = None
+        self.status = []
+        self.tried = []
+        # every guess's number, whether it was right and the board after it, for catch_up() to play again
+        self.feedback = []
+        self.missed = set()
+        self.rights = 0
+        self.wrongs = 0
+        self.modules = [self.random_common_module, self.current_board_module]
+        self.profile = new_profiler()
+
+        self.init_with_length(length)
+
+    def init_with_length(self, l):
+        self.length = l
+        # the game's prediction arena: predictions refer to each other by their number in here
+        self.all_predictions_ever = []
+        self.predictions = []
+        self.prediction_index = PredictionIndex()
+        self.possible = self.dictionary.words_by_length[l]
+        if self.backend == "bitset":
+            self.index = self.dictionary.index(l)
+        elif self.backend == "numpy":
+            self.index = self.dictionary.matrix(l)
+        elif self.backend == "native":
+            self.native = self.dictionary.native(l)
+            self.possible_ids = self.native.all
+        else:
+            # the words' positions in words_by_length[l], for looking up their popularity
+            self.possible_ids = list(range(len(self.possible)))
+        if self.backend in ("bitset", "numpy"):
+            self.possible_mask = self.index.all
+            self.applied = {}
+            self.support = {}
+        self.remaining = 7
+        self.status = ["." for x in range(self.length)]
+        # whether a turn has been answered by the book or table since the engine last caught up with the game
+        self.skipped = False
+
+        self.letters = {}
+        for letter in string.ascii_lowercase:
+            self.letters[letter] = ContainsPrediction(self, letter)
+            self.add_prediction(self.letters[letter])
+
+        for bit_ in self.dictionary.bits:
+            self.add_prediction(UsesBitPrediction(self, bit_))
+
+        self.board = BoardPrediction(self)
+        self.add_prediction(self.board)
+
+    def close(self):
+        """
+        Lets go of the game's predictions once it's over. They point back at the game (and the game at its own
+        methods), so otherwise they wait for the garbage collector; afterwards only the board and counts are left.
+        """
+        for p in self.all_predictions_ever:
+            p.game = None
+            p.parents = p.roots = p._mask = None
+        self.all_predictions_ever = []
+        self.predictions = []
+        self.prediction_index = PredictionIndex()
+        self.letters = {}
+        self.board = None
+        self.modules = []
+        self.applied = {}
+        self.support = {}
+        self.stats = None
+        self._weighing = None
+        self._possible_weighted = {}
+
+    @property
+    def solved(self):
+        return "." not in self.status
+
+    @property
+    def possible_weighted(self):
+        """Every word still possible with its score; the mask based backends only work this out when asked."""
+        if self._possible_weighted is None:
+            self._possible_weighted = self._weighing()
+        return self._possible_weighted
+
+    def weigh_words(self, mask, scored, count):
+        index = self.index
+        totals = dict.fromkeys(index.ids(mask), 0.0)
+        for m, scale in scored:
+            for i in index.ids(m & mask):
+                totals[i] += scale
+        popularity = index.popularity
+        return {index.words[i]: total * popularity[i] / count for i, total in totals.items()}
+
+    def weigh_vectors(self, keep, valid, scales, count):
+        index = self.index
+        scores = (scales @ valid) * index.popularity[keep] / count
+        return dict(zip(index.words_in(keep), scores.tolist()))
+
+    def update_possible(self):
+        profile = self.profile
+        predictions = self.predictions
+        possible_old = self.possible[:]
+        self.possible = []
+        profile.count("words_scanned", len(possible_old))
+
+        with profile.span("forced_validity"):
+            for i, prediction in enumerate(predictions):
+                if i % 8 == 0:
+                    self.progress.report("Checking forced validity of predictions", i, len(predictions))
+                if prediction.false is False and prediction.true is False:
+                    if prediction.good():
+                        prediction.true = True
+                        prediction.false = False
+                    elif len(self.possible) > 1:
+                        tops = self.topmost(prediction)
+                        valid = True
+                        for top in tops:
+                            if not (top.true and not top.false):
+                                valid = False
+                        if valid:
+                            if not prediction.good():
+                                prediction.false = True
+                                prediction.true = False
+
+        board = "".join(self.status)
+        weighted = board.count(".") >= max(2, len(self.status) // 3)
+        with profile.span("validity"):
+            if self.backend == "python":
+                profile.count("valid_for_calls", len(possible_old) * len(predictions))
+                vals = self.check_words(possible_old, weighted)
+            elif self.backend == "numpy":
+                vals = self.check_vectors(weighted)
+            elif self.backend == "native":
+                profile.count("valid_for_calls", len(possible_old) * len(predictions))
+                vals = self.check_native(weighted)
+            else:
+                vals = self.check_masks(possible_old, weighted)
+
+        with profile.span("weighting"):
+            total = len(self.possible)
+            for i, prediction in enumerate(predictions):
+                weight = float(vals[i]) / total
+                predictions[i].weight = weight * predictions[i].weight_scale()
+            self.progress.report("Prediction weighting", len(predictions), len(predictions))
+
+        with profile.span("pruning"):
+            for prediction in predictions:
+                if prediction.weight == 0.0:
+                    self.prediction_index.discard(prediction)
+            before = len(predictions)
+            predictions[:] = [x for x in predictions if x.weight != 0.0]
+            profile.count("predictions_pruned", before - len(predictions))
+
+    def check_words(self, possible_old, weighted):
+        """
+        Checks every prediction against every word, keeping the words no decided prediction rules out. Big sets of
+        words are split over the SOLVER_WORKERS processes (parallel.py).
+        """
+        dictionary = self.dictionary
+        predictions = self.predictions
+        unit, units = dictionary.units(self.length)
+        states = [(1 if p.true else 0) | (2 if p.false else 0) for p in predictions]
+        scales = [p.weight_scale() for p in predictions]
+        words = dictionary.words_by_length[self.length]
+        ids = self.possible_ids
+        count = len(ids)
+
+        def report(done, total):
+            self.progress.report("Word validity checking", done, total)
+
+        pool = parallel.pool_for(dictionary, count)
+        if pool is not None:
+            self.profile.count("parallel_checks")
+            vals, kept, scores = pool.check(self.length, ids, [native.spec(p) for p in predictions], states, scales,
+                                            weighted, report)
+        else:
+            popularity = dictionary.popularity(self.length)
+            tests = [p.valid_for for p in predictions]
+            vals = [0] * len(predictions)
+            kept = []
+            scores = []
+            for start in range(0, count, parallel.PARALLEL_MIN):
+                chunk_vals, chunk_kept, chunk_scores = parallel.check_chunk(
+                    words, popularity, units, ids[start:start + parallel.PARALLEL_MIN], tests, states, scales,
+                    weighted)
+                for i, v in enumerate(chunk_vals):
+                    vals[i] += v
+                kept.extend(chunk_kept)
+                scores.extend(chunk_scores)
+                report(min(count, start + parallel.PARALLEL_MIN), count)
+        report(count, count)
+
+        self.possible_ids = kept
+        self.possible = [words[i] for i in kept]
+        total = float(len(predictions))
+        self._possible_weighted = dict(zip(self.possible, (score / total for score in scores)))
+        # counted in whole units, like check_masks, so the totals don't depend on the order words were added up in
+        return [v * unit for v in vals] if weighted else vals
+
+    def check_masks(self, possible_old, weighted):
+        """
+        The same as check_words, but with every prediction compiled down to a mask over the word list.
+
+        This works incrementally: possible_mask already satisfies every decided prediction in applied, so only
+        predictions that have been decided (or changed their mind) since narrow it further, and each prediction's
+        count over possible_mask is kept in support and just has the dropped words taken off.
+        """
+        index = self.index
+        old = self.possible_mask
+        if weighted != self.support_weighted:
+            # the counts switch from plain word counts to popularity, so start them over
+            self.support = {}
+            self.support_weighted = weighted
+        count = index.weight_units if weighted else popcount
+        unit = index.unit if weighted else 1
+
+        keep = old
+        vals = []
+        scored = []
+        support = {}
+        counted = 0
+        for prediction in self.predictions:
+            m = prediction.mask(index)
+            key = (prediction.key(), prediction.revision)
+            units = self.support.get(key)
+            if units is None:
+                counted += 1
+                units = count(m & old)
+            support[key] = units
+            vals.append(units * unit)
+            scored.append((m, prediction.weight_scale()))
+
+            state = (prediction.true, prediction.false)
+            if state != (False, False) and self.applied.get(key) != state:
+                self.applied[key] = state
+                if prediction.false:
+                    keep &= ~m
+                if prediction.true:
+                    keep &= m
+
+        if keep != old:
+            removed = old & ~keep
+            for prediction in self.predictions:
+                key = (prediction.key(), prediction.revision)
+                if support[key]:
+                    support[key] -= count(prediction.mask(index) & removed)
+            self.possible_mask = keep
+            self.possible = index.words_in(keep)
+        else:
+            self.possible = possible_old
+        self.support = support
+        self.profile.count("support_cache_hits", len(self.predictions) - counted)
+        self.profile.count("support_counted", counted)
+        self.progress.report("Word validity checking", popcount(old), popcount(old))
+
+        self._possible_weighted = None
+        self._weighing = partial(self.weigh_words, keep, scored, float(len(self.predictions)))
+        return vals
+
+    def check_vectors(self, weighted):
+        """check_masks for the numpy backend: builds the prediction by word validity matrix and works from that."""
+        index = self.index
+        predictions = self.predictions
+        old = self.possible_mask
+        count = int(old.sum())
+        valid = numpy.array([p.mask(index)[old] for p in predictions], dtype=bool).reshape(len(predictions), count)
+        false = numpy.array([p.false for p in predictions], dtype=bool)
+        true = numpy.array([p.true for p in predictions], dtype=bool)
+
+        # in whole units, like check_masks, so the counts match the bitset backend's exactly
+        weights = index.units[old] if weighted else numpy.ones(count, dtype=numpy.int64)
+        unit = index.unit if weighted else 1
+        vals = [v * unit for v in (valid @ weights).tolist()]
+        good = ~(valid[false].any(axis=0) | (~valid[true]).any(axis=0))
+
+        keep = old.copy()
+        keep[old] = good
+        self.possible_mask = keep
+        self.possible = index.words_in(keep)
+        self.progress.report("Word validity checking", count, count)
+
+        scales = numpy.array([p.weight_scale() for p in predictions])
+        self._possible_weighted = None
+        self._weighing = partial(self.weigh_vectors, keep, valid[:, good], scales, float(len(predictions)))
+        return vals
+
+    def check_native(self, weighted):
+        """check_words for the native backend, done by hang.cpp over every core (native.py)."""
+        words = self.native
+        count = len(self.possible_ids)
+        vals, self.possible_ids, scores = words.check(self.possible_ids, self.predictions, weighted)
+        self.possible = words.words_in(self.possible_ids)
+        self.progress.report("Word validity checking", count, count)
+
+        total = float(len(self.predictions))
+        self._possible_weighted = dict(zip(self.possible, (score / total for score in scores)))
+        return vals
+
+    def add_prediction(self, p):
+        index = self.prediction_index
+        if index.get(p.key()) is not None:
+            return
+
+        # unique by identity (they're hashed by key), in the order they sit in the predictions list
+        candidates = dict((id(x), x) for x in p.possible_parents(index)).values()
+        for exist in sorted(candidates, key=index.position):
+            if p.depends_on(exist):
+                exist.childs.append(p.number)
+                p.parents.append(exist)
+                p.false = exist.false
+
+        self.predictions.append(p)
+        index.add(p)
+
+    def shuffle_up(self, at):
+        orig = at.childs[:]
+
+        for i in orig:
+            self.predictions.append(self.all_predictions_ever[i])
+            self.prediction_index.add(self.all_predictions_ever[i])
+
+    def depends(self, at):
+        """The predictions at was linked under as a child, oldest first."""
+        return sorted(dict((id(x), x) for x in at.parents).values(), key=attrgetter("number"))
+
+    def topmost(self, a):
+        """
+        The root predictions (ones with no parents) a descends from, or just a if it is a root itself.
+
+        A prediction only gets parents when add_prediction() links it in, so this is worked out once from the
+        parents' own roots and kept on the prediction.
+        """
+        if a.roots is None:
+            if not a.parents:
+                a.roots = [a]
+            else:
+                seen = set()
+                a.roots = [top for parent in self.depends(a) for top in self.topmost(parent)
+                           if not (id(top) in seen or seen.add(id(top)))]
+        return list(a.roots)
+
+    def best(self):
+        good = False
+        gd = -1
+        predco = self.predictions[:]
+        pp = -1
+        while not good:
+            better = (x for x in predco if (x.true is False and x.false is False))
+            first = max(better, key=attrgetter('weight'))
+            again = self.topmost(first)
+            better_again = list((x for x in again if (x.true is False and x.false is False)))
+            if len(better_again) == 0:
+                predco.remove(first)
+                continue
+            else:
+                proper = max(better_again, key=attrgetter('weight'))
+                if proper.number in self.tried:
+                    predco.remove(first)
+                good = True
+                gd = max(better_again, key=attrgetter('weight'))
+                pp = first
+
+        return gd, pp
+
+    def best2(self):
+        good = False
+        gd = -1
+        predco = self.predictions[:]
+        while not good:
+            better = (x for x in predco if (x.true is False and x.false is False))
+            first = max(better, key=attrgetter('weight'))
+            again = self.topmost(first)
+            better_again = list((x for x in again if (x.true is False and x.false is False)))
+            if len(better_again) == 0:
+                predco.remove(first)
+                continue
+            else:
+                proper = max(better_again, key=attrgetter('weight'))
+                if proper.number in self.tried:
+                    predco.remove(first)
+                    continue
+                good = True
+                gd = first
+
+        return gd
+
+    def splits(self, letters, weighted=True):
+        """
+        For each of letters, the total popularity (or count, if not weighted) of the words left that don't have it,
+        and of each group of words that would show the same board if it was guessed.
+        """
+        if self.backend == "bitset":
+            index = self.index
+            weigh = index.weight_units if weighted else popcount
+            found = []
+            for c in letters:
+                misses, hits = index.split(self.possible_mask, c)
+                found.append((weigh(misses), [weigh(m) for m in hits]))
+            return found
+        if self.backend == "numpy":
+            index = self.index
+            weights = index.units if weighted else numpy.ones(len(index.words), dtype=numpy.int64)
+            return index.split(self.possible_mask, letters, weights)
+
+        popularity = self.dictionary.popularity(self.length)
+        found = []
+        for c in letters:
+            misses = 0.0
+            groups = {}
+            for word_id, word in zip(self.possible_ids, self.possible):
+                w = popularity[word_id] if weighted else 1.0
+                pattern = reveal_pattern(word, c)
+                if pattern:
+                    groups[pattern] = groups.get(pattern, 0.0) + w
+                else:
+                    misses += w
+            found.append((misses, list(groups.values())))
+        return found
+
+    def open_letters(self):
+        """The letters that haven't been guessed (or shown to be in or out of the word) yet, alphabetically."""
+        return "".join(c for c, x in sorted(self.letters.items()) if x.true is False and x.false is False)
+
+    def split_report(self):
+        """
+        How the words left would split up for each open letter, before guessing: by letter, how many words don't
+        have it, how many different reveal patterns the rest would show and how many words the biggest of those has,
+        and how many words would be left on average.
+        """
+        letters = self.open_letters()
+        report = {}
+        for c, (misses, hits) in zip(letters, self.splits(letters, weighted=False)):
+            total = misses + sum(hits)
+            report[c] = {
+                "misses": int(misses),
+                "patterns": len(hits),
+                "largest": int(max(hits, default=0)),
+                "expected": float(misses * misses + sum(h * h for h in hits)) / total if total else 0.0,
+            }
+        return report
+
+    def best_split(self):
+        """
+        The open letter that leaves the fewest words on average once its reveal pattern is known, with words
+        counted by popularity: the sum over the groups it splits the words left into of size * size / total.
+        Ties go to the letter more likely to be in the word, then alphabetically.
+        """
+        letters = self.open_letters()
+        if not letters:
+            raise ValueError("no letters left to guess")
+        splits = self.splits(letters)
+        misses, hits = splits[0]
+        if not misses + sum(hits):
+            # none of the words left have any popularity, so just count them
+            splits = self.splits(letters, weighted=False)
+
+        def expected(item):
+            c, (misses, hits) = item
+            total = misses + sum(hits)
+            return (misses * misses + sum(h * h for h in hits)) / total if total else 0.0, -sum(hits), c
+
+        c, _ = min(zip(letters, splits), key=expected)
+        return self.letters[c]
+
+    def current_board_module(self):
+        self.board.update("".join(self.status), self.missed)
+        return [self.board]
+
+    def random_common_module(self):
+        DEPTH = 2
+
+        added = []
+
+        for prediction in self.predictions:
+            if prediction.true == False and prediction.false == False:
+                if type(prediction) == ContainsPrediction:
+                    for letter, count in self.stats.top_followers(prediction.segment, DEPTH):
+                        added.append(ContainsPrediction(self, prediction.segment + letter))
+
+        return added
+
+    def iterate_modules(self):
+        profile = self.profile
+        with profile.span("letter_stats"):
+            segments = [x.segment for x in self.predictions
+                        if type(x) == ContainsPrediction and x.true is False and x.false is False]
+            self.stats = LetterStats(self.possible, segments)
+        with profile.span("modules"):
+            addable = []
+            for module in self.modules:
+                addable.extend(module())
+            before = len(self.predictions)
+            for ad in addable:
+                self.add_prediction(ad)
+            profile.count("predictions_proposed", len(addable))
+            profile.count("predictions_added", len(self.predictions) - before)
+        with profile.span("dedupe"):
+            # drop the repeats shuffle_up can leave behind, keeping the order stable
+            seen = set()
+            self.predictions = [x for x in self.predictions if not (x.key() in seen or seen.add(x.key()))]
+
+    def state_key(self):
+        """What the player has seen so far: the length, the board and the letters that missed."""
+        return self.length, "".join(self.status), "".join(sorted(self.missed))
+
+    def ranked(self, guess):
+        """guess, then the other letters still open, most weight first."""
+        rest = sorted((x for x in self.letters.values() if x is not guess and x.true is False and x.false is False),
+                      key=attrgetter("weight"), reverse=True)
+        return [guess] + rest
+
+    def known_guess(self):
+        """The guess the opening book or the transposition table has for this position, if either does."""
+        if self.book is not None:
+            guess = self.letters.get(self.book.lookup(self.state_key()))
+            if guess is not None and guess.true is False and guess.false is False:
+                # the book only keeps the guess
+                self.candidates = None
+                self.profile.count("book_hits")
+                return guess
+        if self.table is not None:
+            position = self.table.get(self.state_key())
+            if position is not None:
+                for letter in position.guesses:
+                    guess = self.letters.get(letter)
+                    if guess is not None and guess.true is False and guess.false is False:
+                        self.candidates = position.candidates
+                        self.profile.count("table_hits")
+                        return guess
+        return None
+
+    def turn(self):
+        """
+        Runs the modules and rescores everything, then returns the next guess (None once the word is solved).
+
+        Positions the opening book or transposition table know are answered straight from them without running the
+        engine, so possible is left as it was. When the game next reaches a position they don't know, catch_up()
+        first works out what the skipped turns would have added (for the weight strategy), so the engine picks and
+        stores what it would have without them.
+        """
+        with self.profile.turn(self):
+            if not self.solved:
+                guess = self.known_guess()
+                if guess is not None:
+                    self.skipped = True
+                    return guess
+            elif self.skipped:
+                # nothing left to pick, so not worth catching up for
+                return None
+
+            if self.skipped and self.strategy != "entropy":
+                # the entropy strategy only goes by the words left, which the checking below finds from the board
+                # whatever the predictions, so only the weight strategy needs the skipped turns' predictions back
+                with self.profile.span("catch_up"):
+                    self.catch_up()
+            self.skipped = False
+            self.iterate_modules()
+            self.update_possible()
+            self.update_possible()
+            if self.solved:
+                return None
+            with self.profile.span("select"):
+                if self.strategy == "entropy":
+                    guess = self.best_split()
+                else:
+                    guess, _ = self.best()
+            self.candidates = len(self.possible)
+            if self.table is not None:
+                self.table.put(self.state_key(), [x.segment for x in self.ranked(guess)], self.candidates)
+            return guess
+
+    def catch_up(self):
+        """
+        Starts the game over and plays its guesses again, running the modules and checking the words each turn but
+        not picking, so the predictions end up as if the engine had played every turn the book or table answered.
+        Each turn's modules go by the board at the time, which is why they can't just be run on the latest one.
+        """
+        feedback = self.feedback
+        for p in self.all_predictions_ever:
+            p.game = None
+            p.parents = p.roots = p._mask = None
+        self.feedback = []
+        self.tried = []
+        self.missed = set()
+        self.rights = 0
+        self.wrongs = 0
+        self.init_with_length(self.length)
+        for number, correct, status in feedback:
+            self.iterate_modules()
+            self.update_possible()
+            self.update_possible()
+            # the numbers come out the same, since the predictions are added in the same order as before
+            self.apply_feedback(self.all_predictions_ever[number], correct, status)
+
+    def apply_feedback(self, guess, correct, status=None):
+        """
+        Records how a guess from turn() went. status, if given, is the new board (a string or list with "." for
+        blanks); otherwise the board is assumed to have been edited in place.
+        """
+        if status is not None:
+            self.status = list(status)
+        self.feedback.append((guess.number, correct, list(self.status)))
+        self.tried.append(guess.number)
+        if correct:
+            guess.true = True
+            self.shuffle_up(guess)
+            self.rights += 1
+        else:
+            guess.falsify()
+            if len(guess.segment) == 1:
+                self.missed.add(guess.segment)
+            self.wrongs += 1
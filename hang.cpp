@@ -1,5 +1,10 @@
 #include <map>
 #include <algorithm>
+#include <array>
+#include <cstdint>
+#include <limits>
+#include <stdexcept>
+#include <string>
 #include <cstring>
 #include <vector>
 #include <list>
@@ -174,7 +179,8 @@ struct uses_bit_prediction : public prediction {
 			return 0 == word.compare(0, bit.content.size(), bit.content);
 		}
 		else {
-			return 0 == word.compare(word.size() - bit.content.size(), bit.content.size(), bit.content);
+			return word.size() >= bit.content.size() &&
+				0 == word.compare(word.size() - bit.content.size(), bit.content.size(), bit.content);
 		}
 	}
 
@@ -256,6 +262,35 @@ struct matches_holemap_prediction : public prediction {
 	}
 };
 
+struct board_prediction : public prediction {
+	// the board as the python engine keeps it: revealed letters where they are ('.' for a blank), and none of the
+	// excluded letters in the blanks
+
+	P_TYPE(5);
+
+	const std::string plain;
+	const std::string excluded;
+
+	board_prediction(const std::string& plain, const std::string& excluded) : P_BC,
+		plain(plain),
+		excluded(excluded) {
+	}
+
+	bool valid_for(const std::string& word) const override {
+		return word.size() == plain.size() && std::equal(word.begin(), word.end(), plain.begin(), [&](auto a, auto b){
+				return (b == '.' ? excluded.find(a) == std::string::npos : a == b);
+		});
+	}
+
+	bool congruent(const prediction *other) const override {
+		return isa<board_prediction>(other);
+	}
+
+	std::string as_string() const override {
+		return "Word matches "s + plain;
+	}
+};
+
 // loaded file resources
 
 std::vector<std::string> words;
@@ -503,7 +538,8 @@ void update_predictions() {
 	});
 }
 
-void init_file_data() {
+void init_file_data(int length) {
+	// a game only ever looks at words of its own length, so the rest aren't kept
 	std::ifstream word_list("words.txt");
 
 	char line[64] = {0}; // some words are fairly long
@@ -511,7 +547,7 @@ void init_file_data() {
 	while (word_list.getline(line, 64)) {
 		std::string l = line;
 		
-		if (l.find('-') != std::string::npos) continue;
+		if (l.size() != length || l.find('-') != std::string::npos) continue;
 		words.push_back(std::move(l));
 	}
 
@@ -535,7 +571,7 @@ void init_file_data() {
 		pop_list >> word;
 		pop_list >> pop;
 
-		word_popularity[word] = pop;
+		if (word.size() == length) word_popularity[word] = pop;
 		minimum_pop = std::min(pop, minimum_pop);
 	}
 
@@ -545,16 +581,14 @@ void init_file_data() {
 }
 
 void init(int length) {
-	init_file_data();
+	init_file_data(length);
 	init_default_predictions();
 
 	status = std::string(length, '-');
-	
-	for (const auto& word : words) {
-		if (word.size() == length) possible.push_back(word);
-	}
+	possible = words;
 }
 
+#ifndef HANG_LIBRARY
 int main(int argc, char ** argv) {
 	std::cout << "HangmanAI v2.0" << std::endl
 		      << "Copyright (c) Matthew Mirvish 2019" << std::endl
@@ -631,3 +665,89 @@ retry:
 		      << "Wrong guesses: " << wrong_guesses << std::endl;
 	return 0;
 }
+#endif
+
+#ifdef HANG_LIBRARY
+// Built as a library (the hang_native target) this is the word checking for the python engine's native backend
+// (native.py): its check_words, run over a block of same length words split across cores.
+
+std::unique_ptr<prediction> parse_prediction(const std::string& spec) {
+	// "c<segment>", "p<prefix>", "s<suffix>", "b<board> <excluded letters>" or "a" for a prediction that fits
+	// every word
+	if (spec.empty()) return nullptr;
+	auto rest = spec.substr(1);
+	switch (spec[0]) {
+		case 'a':
+			return std::make_unique<prediction>(0);
+		case 'c':
+			return std::make_unique<contains_prediction>(rest);
+		case 'p':
+		case 's':
+			return std::make_unique<uses_bit_prediction>(cbit{spec[0] == 'p', rest});
+		case 'b':
+			{
+				auto space = rest.find(' ');
+				if (space == std::string::npos) return nullptr;
+				return std::make_unique<board_prediction>(rest.substr(0, space), rest.substr(space + 1));
+			}
+		default:
+			return nullptr;
+	}
+}
+
+extern "C" int hang_check(const char *block, int length, const int64_t *units, const double *popularity,
+		const int *ids, int id_count, int weighted, const char *specs, const uint8_t *states, const double *scales,
+		int prediction_count, int64_t *vals, int *kept, double *scores) {
+	// For the words ids (numbered by where they are in block) and the predictions in specs (one a line, with
+	// states bit 0 set for a true one and bit 1 for a false one): adds up in vals the units (or just the number,
+	// if not weighted) of the words each prediction is valid for, and keeps in kept the ids of the words that no
+	// decided prediction rules out, with their summed prediction scales times popularity in scores. Returns how
+	// many words were kept, or -1 for a spec it can't read.
+	std::vector<std::unique_ptr<prediction>> checking;
+	std::string all_specs{specs};
+	for (size_t start = 0, end; start <= all_specs.size() && (int)checking.size() < prediction_count; start = end + 1) {
+		end = std::min(all_specs.find('\n', start), all_specs.size());
+		auto p = parse_prediction(all_specs.substr(start, end - start));
+		if (!p) return -1;
+		checking.push_back(std::move(p));
+	}
+	if ((int)checking.size() != prediction_count) return -1;
+
+	std::vector<uint8_t> good(id_count);
+	std::fill(vals, vals + prediction_count, 0);
+
+#pragma omp parallel
+	{
+		// the counts are whole units, so adding up each thread's share comes out the same however they split
+		std::vector<int64_t> local(prediction_count, 0);
+#pragma omp for schedule(static)
+		for (int i = 0; i < id_count; ++i) {
+			std::string word(block + (size_t)ids[i] * length, length);
+			int64_t amount = weighted ? units[ids[i]] : 1;
+			bool ok = true;
+			double scale = 0;
+			for (int j = 0; j < prediction_count; ++j) {
+				if (checking[j]->valid_for(word)) {
+					local[j] += amount;
+					scale += scales[j];
+					if (states[j] & 2) ok = false;
+				}
+				else if (states[j] & 1) ok = false;
+			}
+			good[i] = ok;
+			scores[i] = scale * popularity[ids[i]];
+		}
+#pragma omp critical
+		for (int j = 0; j < prediction_count; ++j) vals[j] += local[j];
+	}
+
+	int count = 0;
+	for (int i = 0; i < id_count; ++i) {
+		if (good[i]) {
+			kept[count] = ids[i];
+			scores[count++] = scores[i];
+		}
+	}
+	return count;
+}
+#endif
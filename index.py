@@ -0,0 +1,190 @@
+from collections import OrderedDict
+from itertools import compress
+
+try:
+    popcount = int.bit_count
+except AttributeError:
+    def popcount(x):
+        return bin(x).count("1")
+
+# popularity is kept as fixed point with this many bits, so summing it over a mask is a popcount per bit plane
+WEIGHT_BITS = 32
+
+
+class LRUCache(OrderedDict):
+    """A dict that forgets the least recently used entries once it holds more than capacity."""
+
+    def __init__(self, capacity):
+        super(LRUCache, self).__init__()
+        self.capacity = capacity
+
+    def __getitem__(self, key):
+        value = super(LRUCache, self).__getitem__(key)
+        self.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        super(LRUCache, self).__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.capacity:
+            self.popitem(last=False)
+
+
+# the segment and board masks are cached per length and outlive the games that asked for them, so they're capped
+SEGMENTS = 1024
+PATTERNS = 256
+
+
+def quantize(popularity):
+    """
+    Popularity as whole units, with the top popularity 2 ** WEIGHT_BITS units and anything above 0 at least one:
+    returns (how much popularity a unit is, the units for each word).
+    """
+    top = max(popularity) if len(popularity) else 0
+    unit = top / float(1 << WEIGHT_BITS) if top > 0 else 1.0
+    return unit, [max(1, int(round(p / unit))) if p > 0 else 0 for p in popularity]
+
+
+def reveal_pattern(word, c):
+    """The positions c is at in word, as a bitmask (bit i for position i); 0 if it isn't in it."""
+    pattern = 0
+    for pos, x in enumerate(word):
+        if x == c:
+            pattern |= 1 << pos
+    return pattern
+
+
+def mask_from_flags(flags):
+    """Turns a string of '0'/'1' in word order into a mask (bit i is flags[i])."""
+    return int(flags[::-1], 2) if flags else 0
+
+
+class WordIndex(object):
+    """
+    Bitmasks over the word list for one length: bit i of a mask is set when words[i] has some property.
+
+    Everything a prediction can test (letters, letters at a position, prefixes/suffixes, the board) is built
+    out of the per-position masks in at, so filtering and counting words turns into & and popcount.
+    """
+
+    def __init__(self, words, popularity):
+        self.words = words
+        self.popularity = popularity
+        self.length = len(words[0]) if words else 0
+        self.all = (1 << len(words)) - 1
+        self.at = []
+        self.segments = LRUCache(SEGMENTS)
+        self.patterns = LRUCache(PATTERNS)
+        self.partitions = {}
+
+        for pos in range(self.length):
+            column = "".join(word[pos] for word in words)
+            masks = {}
+            encoded = column.encode("latin-1", "replace")
+            for c in set(column):
+                if ord(c) < 256:
+                    masks[c] = mask_from_flags(encoded.translate(_flag_table(ord(c))))
+            self.at.append(masks)
+
+        self.unit, units = quantize(popularity)
+        digits = "{:0%db}" % (WEIGHT_BITS + 1)
+        quantized = [digits.format(u) for u in units]
+        self.planes = []
+        for shift, column in enumerate(reversed(list(zip(*quantized)))):
+            plane = mask_from_flags("".join(column))
+            if plane:
+                self.planes.append((shift, plane))
+
+    def letter_at(self, pos, c):
+        if pos >= self.length:
+            return 0
+        return self.at[pos].get(c, 0)
+
+    def segment(self, s):
+        """Words containing s anywhere."""
+        if s not in self.segments:
+            found = 0
+            for start in range(self.length - len(s) + 1):
+                m = self.all
+                for offset, c in enumerate(s):
+                    m &= self.letter_at(start + offset, c)
+                    if not m:
+                        break
+                found |= m
+            self.segments[s] = found
+        return self.segments[s]
+
+    def prefix(self, s):
+        m = self.all if len(s) <= self.length else 0
+        for pos, c in enumerate(s):
+            m &= self.letter_at(pos, c)
+        return m
+
+    def suffix(self, s):
+        if len(s) > self.length:
+            return 0
+        m = self.all
+        for pos, c in enumerate(s, self.length - len(s)):
+            m &= self.letter_at(pos, c)
+        return m
+
+    def board(self, plain, excluded):
+        """
+        Words that fit a board like "a..le": the revealed letters where they are, and none of the excluded letters
+        in any of the blanks.
+        """
+        key = (plain, excluded)
+        if key not in self.patterns:
+            # every letter guessed so far has to be in exactly the places the board shows it (nowhere, if it was
+            # missed), so this is one partition() group per letter
+            m = self.all if len(plain) == self.length else 0
+            for c in set(excluded).union(plain) - {"."}:
+                if not m:
+                    break
+                m &= self.partition(c).get(reveal_pattern(plain, c), 0)
+            self.patterns[key] = m
+        return self.patterns[key]
+
+    def partition(self, c):
+        """
+        The words grouped by where c is in them: the mask of the words with each reveal_pattern() for c that any
+        word has (0 for the words without c). Worked out the first time c is asked about, then kept.
+        """
+        if c not in self.partitions:
+            groups = {0: self.all} if self.all else {}
+            for pos in range(self.length):
+                at = self.letter_at(pos, c)
+                if not at:
+                    continue
+                split = {}
+                for pattern, m in groups.items():
+                    if m & at:
+                        split[pattern | 1 << pos] = m & at
+                    if m & ~at:
+                        split[pattern] = m & ~at
+                groups = split
+            self.partitions[c] = groups
+        return self.partitions[c]
+
+    def split(self, mask, c):
+        """
+        mask split up by the reveal pattern guessing c would give: the words without c, then one mask per set of
+        positions c is found at.
+        """
+        groups = self.partition(c)
+        return mask & groups.get(0, 0), [mask & m for pattern, m in groups.items() if pattern and mask & m]
+
+    def weight_units(self, mask):
+        """Total popularity of the words in mask, as an exact integer count of unit."""
+        return sum(popcount(mask & plane) << shift for shift, plane in self.planes)
+
+    def ids(self, mask):
+        return list(compress(range(len(self.words)), map("1".__eq__, bin(mask)[:1:-1])))
+
+    def words_in(self, mask):
+        return list(compress(self.words, map("1".__eq__, bin(mask)[:1:-1])))
+
+
+def _flag_table(c):
+    """A bytes.translate table that turns byte c into b"1" and everything else into b"0"."""
+    return b"0" * c + b"1" + b"0" * (255 - c)
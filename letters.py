@@ -0,0 +1,45 @@
+import heapq
+import string
+from collections import Counter
+from operator import itemgetter
+
+
+class LetterStats(object):
+    """
+    Letter counts over one turn's candidate words, built once and shared by every module that turn.
+
+    followers(segment) is how often each letter directly follows segment, over every occurrence in every word, and
+    positions[i] counts the letters found at position i.
+    """
+
+    def __init__(self, words, segments):
+        self.words = words
+        self._positions = None
+        self.table = dict((s, Counter()) for s in segments)
+
+        # one joined string, with a separator so n-grams never run from one word into the next
+        text = "|".join(words)
+        lengths = set(len(s) for s in segments)
+        for k in lengths:
+            grams = Counter(zip(*(text[j:] for j in range(k + 1))))
+            for gram, count in grams.items():
+                if "|" in gram or gram[-1] not in string.ascii_lowercase:
+                    continue
+                followers = self.table.get("".join(gram[:-1]))
+                if followers is not None:
+                    followers[gram[-1]] += count
+
+    def followers(self, segment):
+        return self.table.get(segment, Counter())
+
+    def top_followers(self, segment, k):
+        """The k letters that most often follow segment (ties go alphabetically), leaving out ones that never do."""
+        counts = self.followers(segment)
+        found = ((c, counts[c]) for c in string.ascii_lowercase if counts[c])
+        return heapq.nlargest(k, found, key=itemgetter(1))
+
+    @property
+    def positions(self):
+        if self._positions is None:
+            self._positions = [Counter(column) for column in zip(*self.words)]
+        return self._positions
@@ -0,0 +1,100 @@
+from index import LRUCache, PATTERNS, SEGMENTS, quantize, reveal_pattern
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class WordMatrix(object):
+    """
+    The NumPy take on WordIndex: one length's words as a uint8 matrix (a row per word) plus a popularity vector.
+    The matrix is a view straight onto the dictionary's word block (mapped from dictionary.bin, for a
+    MappedDictionary); the popularity is copied out of the decoded doubles.
+
+    It answers the same questions as WordIndex (segment, prefix, suffix, board) but with boolean
+    vectors over the words instead of int bitmasks, so predictions compile against either one unchanged.
+    """
+
+    def __init__(self, words, popularity, block):
+        self.words = words
+        self.length = len(words[0]) if words else 0
+        self.matrix = numpy.frombuffer(block, dtype=numpy.uint8).reshape(len(words), self.length)
+        self.popularity = numpy.array(popularity, dtype=numpy.float64)
+        # popularity in WordIndex's whole units, so sums of it are exact and come out the same in any order
+        self.unit, units = quantize(self.popularity)
+        self.units = numpy.array(units, dtype=numpy.int64)
+        self.all = numpy.ones(len(words), dtype=bool)
+        self.segments = LRUCache(SEGMENTS)
+        self.patterns = LRUCache(PATTERNS)
+        self.partitions = {}
+        self.powers = numpy.left_shift(1, numpy.arange(self.length, dtype=numpy.int64))
+
+    def letter_at(self, pos, c):
+        if pos >= self.length or ord(c) > 255:
+            return numpy.zeros(len(self.words), dtype=bool)
+        return self.matrix[:, pos] == ord(c)
+
+    def segment(self, s):
+        if s not in self.segments:
+            found = numpy.zeros(len(self.words), dtype=bool)
+            for start in range(self.length - len(s) + 1):
+                m = self.all.copy()
+                for offset, c in enumerate(s):
+                    m &= self.letter_at(start + offset, c)
+                found |= m
+            self.segments[s] = found
+        return self.segments[s]
+
+    def prefix(self, s):
+        m = self.all.copy() if len(s) <= self.length else ~self.all
+        for pos, c in enumerate(s):
+            m &= self.letter_at(pos, c)
+        return m
+
+    def suffix(self, s):
+        if len(s) > self.length:
+            return ~self.all
+        m = self.all.copy()
+        for pos, c in enumerate(s, self.length - len(s)):
+            m &= self.letter_at(pos, c)
+        return m
+
+    def board(self, plain, excluded):
+        key = (plain, excluded)
+        if key not in self.patterns:
+            m = self.all.copy() if len(plain) == self.length else ~self.all
+            for c in set(excluded).union(plain) - {"."}:
+                m &= self.partition(c) == reveal_pattern(plain, c)
+            self.patterns[key] = m
+        return self.patterns[key]
+
+    def partition(self, c):
+        """WordIndex.partition() as a vector: each word's reveal_pattern() for c. Kept once worked out."""
+        if c not in self.partitions:
+            if ord(c) > 255:
+                self.partitions[c] = numpy.zeros(len(self.words), dtype=numpy.int64)
+            else:
+                self.partitions[c] = (self.matrix == ord(c)) @ self.powers
+        return self.partitions[c]
+
+    def split(self, vector, letters, weights):
+        """
+        split() from WordIndex for several letters at once, as weights (whole numbers, like units): for each letter,
+        the total of weights over the words in vector without it and a list of the totals for each set of positions
+        it is found at, all as ints.
+        """
+        weights = weights[vector]
+        splits = []
+        for c in letters:
+            patterns = self.partition(c)[vector]
+            hit = patterns != 0
+            _, groups = numpy.unique(patterns[hit], return_inverse=True)
+            totals = numpy.zeros(groups.max() + 1 if groups.size else 0, dtype=numpy.int64)
+            numpy.add.at(totals, groups.ravel(), weights[hit])
+            splits.append((int(weights[~hit].sum()), totals.tolist()))
+        return splits
+
+    def words_in(self, vector):
+        words = self.words
+        return [words[i] for i in numpy.flatnonzero(vector).tolist()]
@@ -0,0 +1,94 @@
+"""
+The native backend: hang.cpp built as a shared library (the hang_native target in CMakeLists.txt) and called through
+ctypes, so checking every word against every prediction runs in C++ over all the cores with OpenMP.
+
+    mkdir build && cd build && cmake .. && make
+
+The library is looked for at HANG_NATIVE_LIB, then in build/ and next to this file. Without it lib is None, and
+games asked for the native backend play with the bitset one instead (which picks the same guesses).
+"""
+import ctypes
+import os
+from array import array
+
+from index import quantize
+
+NAMES = ("libhang_native.so", "libhang_native.dylib", "hang_native.dll")
+
+
+def _load():
+    here = os.path.dirname(os.path.abspath(__file__))
+    paths = [os.getenv("HANG_NATIVE_LIB")]
+    paths += [os.path.join(here, directory, name) for directory in ("build", "") for name in NAMES]
+    for path in paths:
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            found = ctypes.CDLL(path)
+        except OSError:
+            continue
+        found.hang_check.restype = ctypes.c_int
+        found.hang_check.argtypes = [
+            ctypes.c_char_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p,
+            ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_char_p, ctypes.c_char_p, ctypes.c_void_p,
+            ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+        ]
+        return found
+    return None
+
+
+lib = _load()
+
+
+def spec(prediction):
+    """How hang_check reads a prediction: c, p or s and the segment or bit, or b, the board and the excluded letters."""
+    key = prediction.key()
+    if key[0] == "contains":
+        return "c" + prediction.segment
+    if key[0] == "bit":
+        suffix, text = prediction.bit
+        return ("s" if suffix else "p") + text
+    if key[0] == "board":
+        return "b" + prediction.plain + " " + "".join(sorted(prediction.excluded))
+    return "a"
+
+
+def _address(buffer):
+    return ctypes.addressof(ctypes.c_char.from_buffer(buffer)) if len(buffer) else None
+
+
+class NativeWords(object):
+    """One word length laid out for hang_check: the words as one block of bytes and their popularity (as units too)."""
+
+    def __init__(self, words, popularity, block):
+        self.words = words
+        self.length = len(words[0]) if words else 0
+        self.block = bytes(block)
+        self.popularity = array("d", popularity)
+        self.unit, units = quantize(self.popularity)
+        self.units = array("q", units)
+        # every word, by its position in words
+        self.all = array("i", range(len(words)))
+
+    def words_in(self, ids):
+        return [self.words[i] for i in ids]
+
+    def check(self, ids, predictions, weighted):
+        """
+        check_words for the words ids: returns each prediction's count (popularity if weighted) over them, the ids
+        no decided prediction rules out and for each of those its summed prediction scales times popularity.
+        """
+        count = len(predictions)
+        specs = "\n".join(spec(p) for p in predictions).encode("latin-1", "replace")
+        states = bytes((1 if p.true else 0) | (2 if p.false else 0) for p in predictions)
+        scales = array("d", (p.weight_scale() for p in predictions))
+        vals = array("q", bytes(8 * count))
+        kept = array("i", bytes(4 * len(ids)))
+        scores = array("d", bytes(8 * len(ids)))
+        found = lib.hang_check(self.block, self.length, _address(self.units), _address(self.popularity),
+                               _address(ids), len(ids), int(weighted), specs, states, _address(scales), count,
+                               _address(vals), _address(kept), _address(scores))
+        if found < 0:
+            raise ValueError("hang_check couldn't read a prediction")
+        unit = self.unit if weighted else 1
+        return [v * unit for v in vals], kept[:found], scores[:found]
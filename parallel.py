@@ -0,0 +1,168 @@
+"""
+Word by word checking (the python backend's Game.check_words) split over worker processes, for the first turns of
+long words and big dictionaries where tens of thousands of words get checked against every prediction.
+
+    SOLVER_WORKERS=4    check in 4 processes (0 for one per core); 1, the default, checks in the game's own process
+
+The workers are forked with the dictionary already loaded, so all they are sent each turn is the predictions (as
+native.spec() strings) and which slice of the word ids to check; the ids themselves sit in memory shared with them.
+Each sends back its counts and the ids it kept. The counts are whole popularity units (or words), so adding them up
+comes out exactly as checking in one go, the same as the reduction(+:vals) in hang.cpp. Fewer than PARALLEL_MIN
+words are checked in process, since handing them out would cost more than it saves.
+
+The pool is kept on the dictionary (Dictionary.check_pool) and shut down when the dictionary is collected. It is
+forked the first time a game needs it, unless start() was called first; programs with threads of their own
+(wordcount.py thinks in one) should call it before starting them, since a process forked while other threads are
+running can be left waiting on locks they held.
+"""
+import mmap
+import multiprocessing
+import os
+import weakref
+from array import array
+
+workers = int(os.getenv("SOLVER_WORKERS", "1")) or os.cpu_count() or 1
+# also how many words the in process check does between progress reports
+PARALLEL_MIN = 2000
+
+# what the worker processes check with, set as they start
+_worker = {}
+
+
+def valid_for(spec):
+    """A function telling whether a word fits the prediction native.spec() turned into spec."""
+    kind, text = spec[0], spec[1:]
+    if kind == "c":
+        return lambda word: text in word
+    if kind == "p":
+        return lambda word: word.startswith(text)
+    if kind == "s":
+        return lambda word: word.endswith(text)
+    if kind == "b":
+        plain, _, excluded = text.partition(" ")
+
+        def fits(word):
+            for w, c in zip(word, plain):
+                if c == ".":
+                    if w in excluded:
+                        return False
+                elif w != c:
+                    return False
+            return True
+        return fits
+    return lambda word: True
+
+
+def check_chunk(words, popularity, units, ids, tests, states, scales, weighted):
+    """
+    Checks the words ids against the predictions, given as their valid_for functions in tests, with states (bit 0
+    set for a true prediction, bit 1 for a false one) and weight scales alongside. Returns each prediction's count
+    over the words (in units if weighted), the ids no decided prediction rules out and for each of those the scales
+    of the predictions it fits times its popularity.
+    """
+    vals = [0] * len(tests)
+    kept = []
+    scores = []
+    checks = list(zip(range(len(tests)), tests, states, scales))
+    for i in ids:
+        word = words[i]
+        amount = units[i] if weighted else 1
+        good = True
+        scale = 0.0
+        for j, test, state, s in checks:
+            if test(word):
+                vals[j] += amount
+                scale += s
+                if state & 2:
+                    good = False
+            elif state & 1:
+                good = False
+        if good:
+            kept.append(i)
+            scores.append(scale * popularity[i])
+    return vals, kept, scores
+
+
+def _init_worker(dictionary, ids):
+    # a weak reference, so the pool doesn't keep the dictionary alive in the parent; forking copies what it points to
+    _worker["dictionary"] = dictionary()
+    _worker["ids"] = ids
+
+
+def _check(task):
+    length, start, end, specs, states, scales, weighted = task
+    dictionary = _worker["dictionary"]
+    ids = array("i")
+    ids.frombytes(_worker["ids"][4 * start:4 * end])
+    return check_chunk(dictionary.words_by_length[length], dictionary.popularity(length),
+                       dictionary.units(length)[1], ids, [valid_for(spec) for spec in specs], states, scales, weighted)
+
+
+class CheckPool(object):
+    """The worker processes checking words for one dictionary, and the shared memory the word ids go through."""
+
+    def __init__(self, dictionary, processes, capacity):
+        self.processes = processes
+        self.capacity = capacity
+        # anonymous and shared, so the forked workers see whatever is written into it
+        self.ids = mmap.mmap(-1, 4 * capacity)
+        self.pool = multiprocessing.get_context("fork").Pool(processes, initializer=_init_worker,
+                                                             initargs=(weakref.ref(dictionary), self.ids))
+        self._finalizer = weakref.finalize(dictionary, self.close)
+
+    def check(self, length, ids, specs, states, scales, weighted, report):
+        """check_chunk() over ids, in one slice per worker (two, to even them out) checked side by side."""
+        count = len(ids)
+        self.ids[:4 * count] = array("i", ids).tobytes()
+        step = -(-count // (2 * self.processes))
+        tasks = [(length, start, min(count, start + step), specs, states, scales, weighted)
+                 for start in range(0, count, step)]
+        vals = [0] * len(specs)
+        kept = []
+        scores = []
+        for task, (chunk_vals, chunk_kept, chunk_scores) in zip(tasks, self.pool.imap(_check, tasks)):
+            for j, v in enumerate(chunk_vals):
+                vals[j] += v
+            kept.extend(chunk_kept)
+            scores.extend(chunk_scores)
+            report(task[2], count)
+        return vals, kept, scores
+
+    def close(self):
+        if self.ids.closed:
+            return
+        self._finalizer.detach()
+        self.pool.terminate()
+        self.pool.join()
+        self.ids.close()
+
+
+def start(dictionary, count=0):
+    """
+    The CheckPool for dictionary, forked now if it hasn't been yet or has no room for count word ids, or None when
+    words should be checked in process: one worker, or in a process that can't fork workers of its own.
+    """
+    if workers <= 1 or multiprocessing.current_process().daemon:
+        return None
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    pool = dictionary.check_pool
+    if pool is not None and pool.capacity < count:
+        # the ids won't fit, so start over with more room
+        pool.close()
+        pool = None
+    if pool is None:
+        # room for the ids of the biggest length there is, where the dictionary knows that without loading them
+        if hasattr(dictionary, "lengths"):
+            sizes = [section["count"] for section in dictionary.lengths.values()]
+        else:
+            sizes = [len(words) for words in dictionary.words_by_length.values()]
+        pool = dictionary.check_pool = CheckPool(dictionary, workers, max([count, 1] + sizes))
+    return pool
+
+
+def pool_for(dictionary, count):
+    """The CheckPool to check count words of dictionary with (see start()), or None for too few words."""
+    if count < PARALLEL_MIN:
+        return None
+    return start(dictionary, count)
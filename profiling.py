@@ -0,0 +1,99 @@
+"""
+Per-turn timing spans and counters for the engine, switched on with SOLVER_PROFILE (like WEIGHT_USAGE):
+
+    SOLVER_PROFILE=1         a JSON line per turn in SOLVER_PROFILE_DIR/turns.jsonl: how long each phase of the turn
+                             took and counters (words scanned, valid_for calls, predictions added and pruned, ...)
+    SOLVER_PROFILE=cprofile  the same, plus a cProfile dump per game in SOLVER_PROFILE_DIR (read it with pstats)
+
+With it off every game gets the NullProfiler, whose spans and counters do nothing.
+"""
+import cProfile
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+enable_profile = os.getenv("SOLVER_PROFILE", "0")
+profile_dir = os.getenv("SOLVER_PROFILE_DIR", "profiles")
+
+_games = itertools.count()
+_null = nullcontext()
+
+
+class NullProfiler(object):
+    def span(self, name):
+        return _null
+
+    def turn(self, game):
+        return _null
+
+    def count(self, name, n=1):
+        pass
+
+
+class Profiler(object):
+    """
+    Collects the spans and counters of one game's turns, writing each turn out as a JSON line when it ends.
+    Spans that happen more than once a turn (update_possible runs twice) add up.
+    """
+
+    def __init__(self, directory, cprofile=False):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.game = "{}-{}".format(os.getpid(), next(_games))
+        self.turns = 0
+        self.spans = Counter()
+        self.counters = Counter()
+        self.cprofile = cProfile.Profile() if cprofile else None
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name] += time.perf_counter() - start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    @contextmanager
+    def turn(self, game):
+        self.spans.clear()
+        self.counters.clear()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        try:
+            with self.span("turn"):
+                yield
+        finally:
+            if self.cprofile is not None:
+                self.cprofile.disable()
+                # rewritten every turn, since nothing tells a game it is over
+                self.cprofile.dump_stats(os.path.join(self.directory, "game-{}.prof".format(self.game)))
+            self.write(game)
+
+    def write(self, game):
+        record = {
+            "game": self.game,
+            "turn": self.turns,
+            "length": game.length,
+            "backend": game.backend,
+            "strategy": game.strategy,
+            "board": "".join(game.status),
+            "candidates": game.candidates,
+            "ms": dict((name, seconds * 1000.0) for name, seconds in self.spans.items()),
+            "counters": dict(self.counters),
+        }
+        self.turns += 1
+        with open(os.path.join(self.directory, "turns.jsonl"), "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def new_profiler():
+    """The profiler for a new game, going by SOLVER_PROFILE."""
+    if enable_profile in ("", "0"):
+        return NullProfiler()
+    return Profiler(profile_dir, cprofile=enable_profile == "cprofile")
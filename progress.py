@@ -0,0 +1,31 @@
+import time
+
+# how often listeners hear about progress at most, per second
+RATE = 30.0
+
+
+class Progress(object):
+    """
+    Where a Game reports how far through a turn it is. Listeners get the report as text ("Word validity checking:
+    150 of 7292"), but no more than rate times a second however often the engine reports, and with no listeners
+    reporting does nothing at all.
+    """
+
+    def __init__(self, *listeners, rate=RATE):
+        self.listeners = list(listeners)
+        self.interval = 1.0 / rate if rate else 0.0
+        self.last = None
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def report(self, stage, done, total):
+        if not self.listeners:
+            return
+        now = time.monotonic()
+        if self.last is not None and now - self.last < self.interval:
+            return
+        self.last = now
+        text = "{}: {} of {}".format(stage, done, total)
+        for listener in self.listeners:
+            listener(text)
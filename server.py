@@ -0,0 +1,317 @@
+"""
+The solver as a small HTTP/JSON service on localhost, for playing several games at once without the pygame window.
+
+    python server.py --port 8765 --workers 2
+
+    POST   /sessions                {"length": 7}                      start a game, returns its first guess
+    GET    /sessions/<id>                                              the current guess again
+    POST   /sessions/<id>/feedback  {"correct": true, "board": "..e.."}  how the guess went, returns the next one
+    DELETE /sessions/<id>                                              end the game
+
+Every guess comes back as {"session", "guess", "solved", "candidates", "top", "splits", "rights", "wrongs"}, where
+guess is null once the word is solved, top is the most likely remaining words with their scores and splits is how the
+remaining words would split up for each letter not guessed yet (Game.split_report()). Feedback is turned away with a
+400 before the game is touched if its board is the wrong length, has anything but lowercase letters and ".", doesn't
+fit the board so far and the guess, or is for a right guess but doesn't show the guess anywhere new. Turns run in
+worker processes (each session stays on the one that holds its Game) so the event loop keeps answering while they
+think, and sessions nobody has touched for --idle seconds are dropped.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import time
+import traceback
+import uuid
+from http import HTTPStatus
+
+from dictionary import load_dictionary
+from engine import Game, default_backend, default_strategy
+
+TOP = 10
+
+# the games a worker process holds, by session id, and what it plays them with
+_worker = {"sessions": {}}
+
+
+def _init_worker(directory, backend, strategy):
+    if "dictionary" not in _worker:
+        _worker["dictionary"] = load_dictionary(directory, verbose=False)
+    _worker["backend"] = backend
+    _worker["strategy"] = strategy
+
+
+def _state(session_id):
+    game, guess = _worker["sessions"][session_id]
+    top = sorted(game.possible_weighted.items(), key=lambda item: (-item[1], item[0]))[:TOP]
+    return {
+        "session": session_id,
+        "guess": None if guess is None else guess.segment,
+        "solved": game.solved,
+        "candidates": len(game.possible),
+        "top": [[word, score] for word, score in top],
+        "splits": {} if guess is None else game.split_report(),
+        "rights": game.rights,
+        "wrongs": game.wrongs,
+    }
+
+
+class GameError(Exception):
+    """A request the game can't take, raised in a worker; the message is meant for the client."""
+    status = HTTPStatus.CONFLICT
+
+
+class BadFeedback(GameError):
+    """Feedback that doesn't fit the game; it is raised before anything about the game has changed."""
+    status = HTTPStatus.BAD_REQUEST
+
+
+def _check_board(game, guess, correct, board):
+    if len(board) != game.length:
+        raise BadFeedback("the board should be {} long".format(game.length))
+    if any(c != "." and not "a" <= c <= "z" for c in board):
+        raise BadFeedback("the board should only have lowercase letters, and . for blanks")
+    shown = set()
+    for old, new in zip(game.status, board):
+        if old != "." and new != old:
+            raise BadFeedback("the board changes letters that were already shown")
+        if old == "." and new != ".":
+            shown.add(new)
+    if not correct and shown:
+        raise BadFeedback("a wrong guess can't show any letters")
+    if shown - set(guess.segment):
+        raise BadFeedback("the board shows letters that weren't guessed")
+    if correct and not any(board.startswith(guess.segment, i) and "." in game.status[i:i + len(guess.segment)]
+                           for i in range(len(board))):
+        raise BadFeedback("a right guess has to show where it is on the board")
+
+
+def _start(session_id, length):
+    game = Game(_worker["dictionary"], length, backend=_worker["backend"], strategy=_worker["strategy"])
+    try:
+        _worker["sessions"][session_id] = (game, game.turn())
+        return _state(session_id)
+    except Exception:
+        # the server doesn't keep sessions that failed to start, so neither does the worker
+        _worker["sessions"].pop(session_id, None)
+        game.close()
+        raise
+
+
+def _feedback(session_id, correct, board):
+    game, guess = _worker["sessions"][session_id]
+    if guess is None:
+        raise GameError("the word is already solved" if game.solved else "there is no guess waiting for feedback")
+    # no board means it hasn't changed
+    _check_board(game, guess, correct, "".join(game.status) if board is None else board)
+    game.apply_feedback(guess, correct, board)
+    # if the turn fails there's no guess to give feedback on, rather than the old one being applied twice
+    _worker["sessions"][session_id] = (game, None)
+    _worker["sessions"][session_id] = (game, game.turn())
+    return _state(session_id)
+
+
+def _close(session_id):
+    game, _ = _worker["sessions"].pop(session_id, (None, None))
+    if game is not None:
+        game.close()
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+
+class Session(object):
+    def __init__(self, session_id, worker):
+        self.id = session_id
+        self.worker = worker
+        self.lock = asyncio.Lock()
+        self.used = time.monotonic()
+
+
+class Server(object):
+    """
+    Keeps track of the sessions and which worker holds each; the workers are one process pools so a session's
+    Game never has to move between processes.
+    """
+
+    def __init__(self, dictionary, directory=".", backend=default_backend, workers=1, idle=600.0,
+                 strategy=default_strategy):
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+            # forked workers share the already loaded dictionary
+            _worker["dictionary"] = dictionary
+        else:
+            context = multiprocessing.get_context()
+        self.dictionary = dictionary
+        self.idle = idle
+        self.sessions = {}
+        self.workers = [concurrent.futures.ProcessPoolExecutor(1, context, _init_worker,
+                                                             (directory, backend, strategy))
+                        for _ in range(workers)]
+        for worker in self.workers:
+            # start the processes now, before the event loop and its threads are running
+            worker.submit(int).result()
+        self.load = [0] * workers
+
+    async def run(self, worker, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.workers[worker], function, *args)
+
+    async def start(self, length):
+        if not isinstance(length, int) or length not in self.dictionary.words_by_length:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "no words of length {}".format(length))
+        worker = self.load.index(min(self.load))
+        session = Session(uuid.uuid4().hex, worker)
+        # taken before starting, so games started at the same time spread over the workers
+        self.load[worker] += 1
+        try:
+            reply = await self.played(session, _start, length)
+        except BaseException:
+            self.load[worker] -= 1
+            raise
+        # only kept once the game has started, so a failed start leaves nothing behind
+        self.sessions[session.id] = session
+        return reply
+
+    async def state(self, session):
+        async with session.lock:
+            return await self.run(session.worker, _state, session.id)
+
+    async def feedback(self, session, correct, board):
+        if not isinstance(correct, bool):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "correct should be true or false")
+        if board is not None and not isinstance(board, str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "board should be a string with . for blanks")
+        async with session.lock:
+            return await self.played(session, _feedback, correct, board)
+
+    async def played(self, session, function, *args):
+        try:
+            return await self.run(session.worker, function, session.id, *args)
+        except GameError as e:
+            raise HTTPError(e.status, str(e))
+        except (ValueError, ZeroDivisionError):
+            # the word isn't in the dictionary: nothing left to guess
+            raise HTTPError(HTTPStatus.CONFLICT, "no words fit the board")
+        except Exception:
+            traceback.print_exc()
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, "the game failed")
+
+    async def close(self, session):
+        if self.sessions.pop(session.id, None) is not None:
+            self.load[session.worker] -= 1
+            await self.run(session.worker, _close, session.id)
+
+    def session(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "no session {}".format(session_id))
+        session.used = time.monotonic()
+        return session
+
+    async def evict(self):
+        """Drops sessions that have been idle too long, every so often."""
+        while True:
+            await asyncio.sleep(min(self.idle, 60.0))
+            now = time.monotonic()
+            for session in list(self.sessions.values()):
+                if now - session.used > self.idle and not session.lock.locked():
+                    await self.close(session)
+
+    async def route(self, method, path, body):
+        parts = [p for p in path.split("?")[0].split("/") if p]
+        if parts == ["sessions"] and method == "POST":
+            return HTTPStatus.CREATED, await self.start(body.get("length"))
+        if len(parts) >= 2 and parts[0] == "sessions":
+            session = self.session(parts[1])
+            if len(parts) == 2 and method == "GET":
+                return HTTPStatus.OK, await self.state(session)
+            if len(parts) == 2 and method == "DELETE":
+                await self.close(session)
+                return HTTPStatus.OK, {"session": session.id, "closed": True}
+            if parts[2:] == ["feedback"] and method == "POST":
+                return HTTPStatus.OK, await self.feedback(session, body.get("correct"), body.get("board"))
+        raise HTTPError(HTTPStatus.NOT_FOUND, "no route for {} {}".format(method, path))
+
+    async def handle(self, reader, writer):
+        """One connection: reads requests (keeping the connection open unless asked not to) and answers each."""
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                try:
+                    method, path, version = line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = header.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                raw = await reader.readexactly(int(headers.get("content-length", 0) or 0))
+
+                try:
+                    body = json.loads(raw) if raw.strip() else {}
+                    if not isinstance(body, dict):
+                        raise ValueError
+                except ValueError:
+                    status, reply = HTTPStatus.BAD_REQUEST, {"error": "the body should be a JSON object"}
+                else:
+                    try:
+                        status, reply = await self.route(method.upper(), path, body)
+                    except HTTPError as e:
+                        status, reply = e.status, {"error": str(e)}
+                    except Exception:
+                        # still answer, rather than dropping the connection
+                        traceback.print_exc()
+                        status, reply = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "internal error"}
+
+                keep = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+                data = json.dumps(reply).encode("utf-8")
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status.value, status.phrase, len(data),
+                                                             "keep-alive" if keep else "close").encode("latin-1"))
+                writer.write(data)
+                await writer.drain()
+                if not keep:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        listener = await asyncio.start_server(self.handle, host, port)
+        evicting = asyncio.create_task(self.evict())
+        print("- Serving on http://{}:{}".format(host, port))
+        try:
+            async with listener:
+                await listener.serve_forever()
+        finally:
+            evicting.cancel()
+            for worker in self.workers:
+                worker.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves the solver over HTTP/JSON on localhost.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="processes to run turns in")
+    parser.add_argument("--idle", type=float, default=600.0, help="seconds before an untouched session is dropped")
+    parser.add_argument("--backend", default=default_backend)
+    parser.add_argument("--strategy", default=default_strategy, choices=["weight", "entropy"])
+    parser.add_argument("--directory", default=".", help="where the dictionary files are")
+    args = parser.parse_args()
+
+    server = Server(load_dictionary(args.directory, verbose=False), args.directory, args.backend, args.workers,
+                    args.idle, args.strategy)
+    try:
+        asyncio.run(server.serve("127.0.0.1", args.port))
+    except KeyboardInterrupt:
+        pass
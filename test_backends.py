@@ -0,0 +1,89 @@
+"""
+Every backend has to pick the same guesses as the bitset one, with either strategy: they only differ in how they
+check and count the words. Played on a small made up dictionary, so it runs without the word lists.
+
+    python -m pytest test_backends.py
+"""
+import multiprocessing
+import random
+from array import array
+
+import pytest
+
+import native
+import parallel
+from benchmark import reveal
+from dictionary import POPULARITY, PackedDictionary, popularity_code
+from engine import Game
+from matrix import numpy
+
+LETTERS = "eeeeeaaaarrriiioootttnnsslcudpmhgbfywkvxzjq"
+BITS = [(False, "re"), (False, "un"), (False, "st"), (True, "ed"), (True, "er"), (True, "es"), (True, "ing")]
+
+
+def make_dictionary():
+    rand = random.Random(0)
+    blocks = {}
+    codes = {}
+    for length in (5, 6):
+        words = set()
+        while len(words) < 400:
+            words.add("".join(rand.choice(LETTERS) for _ in range(length)))
+        blocks[length] = bytearray("".join(sorted(words)).encode("latin-1"))
+        # a few popularity levels, so plenty of words tie
+        codes[length] = array("H", (popularity_code(rand.choice((1.0, 0.5, 0.1, 0.01))) for _ in words))
+    lengths = dict((length, {"count": len(codes[length])}) for length in blocks)
+    return PackedDictionary(lengths, blocks, codes, POPULARITY[popularity_code(0.01)], BITS, "test")
+
+
+def play(dictionary, word, backend, strategy):
+    game = Game(dictionary, len(word), backend=backend, strategy=strategy)
+    letters = set()
+    guesses = []
+    while True:
+        guess = game.turn()
+        if guess is None or len(guesses) >= 26:
+            break
+        guesses.append(guess.segment)
+        correct = guess.segment in word
+        if correct:
+            letters.update(guess.segment)
+        game.apply_feedback(guess, correct, reveal(word, letters))
+    game.close()
+    return guesses
+
+
+@pytest.fixture(scope="module")
+def dictionary():
+    dictionary = make_dictionary()
+    yield dictionary
+    if dictionary.check_pool is not None:
+        dictionary.check_pool.close()
+
+
+@pytest.fixture(scope="module")
+def words(dictionary):
+    return [words[i] for words in dictionary.words_by_length.values() for i in range(0, len(words), 50)]
+
+
+def backends():
+    found = ["python", "workers"]
+    if numpy is not None:
+        found.append("numpy")
+    if native.lib is not None:
+        found.append("native")
+    return found
+
+
+@pytest.mark.parametrize("strategy", ["weight", "entropy"])
+@pytest.mark.parametrize("backend", backends())
+def test_same_guesses_as_bitset(dictionary, words, backend, strategy, monkeypatch):
+    if backend == "workers":
+        if "fork" not in multiprocessing.get_all_start_methods():
+            pytest.skip("the worker processes are forked")
+        # the python backend, with every check handed out to two worker processes
+        monkeypatch.setattr(parallel, "workers", 2)
+        monkeypatch.setattr(parallel, "PARALLEL_MIN", 1)
+        backend = "python"
+    expected = [play(dictionary, word, "bitset", strategy) for word in words]
+    assert [play(dictionary, word, backend, strategy) for word in words] == expected
@@ -0,0 +1,104 @@
+"""
+A transposition table: what the engine decided for each position it has seen, shared between games.
+
+Games against different words keep landing on the same position (length, board and missed letters), so a
+Game(table=...) looks the position up before running the engine and stores what it decided afterwards. The weight
+strategy's choice also depends on the predictions earlier turns added, so a game that reaches a position the table
+doesn't know plays the turns it answered again first (Game.catch_up()); what is stored is always what the engine
+alone would have picked there. Positions are kept in memory, least recently used dropped first once there are more
+than capacity, and optionally in an SQLite file that several processes can share.
+"""
+import os
+import sqlite3
+from collections import OrderedDict, namedtuple
+
+from engine import default_strategy
+
+# guesses is the engine's ranking of the letters it could guess next, best first, and candidates how many words
+# were left
+Position = namedtuple("Position", ["guesses", "candidates"])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    fingerprint TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    board TEXT NOT NULL,
+    missed TEXT NOT NULL,
+    guesses TEXT NOT NULL,
+    candidates INTEGER NOT NULL,
+    PRIMARY KEY (fingerprint, strategy, length, board, missed)
+)
+"""
+
+
+class TranspositionTable(object):
+    """
+    Positions for one dictionary and strategy, by Game.state_key(). fingerprint is the dictionary's, so a table (or
+    store) made against another dictionary isn't used for it.
+    """
+
+    def __init__(self, fingerprint, strategy=default_strategy, capacity=100000, path=None):
+        self.fingerprint = fingerprint
+        self.strategy = strategy
+        self.capacity = capacity
+        self.path = path
+        self.positions = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._store = None
+        self._pid = None
+
+    @property
+    def store(self):
+        """The SQLite connection, if there's a path; reopened after a fork since connections can't be shared."""
+        if self.path is None:
+            return None
+        if self._pid != os.getpid():
+            self._store = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._store.execute("PRAGMA journal_mode=WAL")
+            self._store.execute(SCHEMA)
+            # rows from other dictionaries are never going to be read again
+            self._store.execute("DELETE FROM positions WHERE fingerprint != ?", (self.fingerprint,))
+            self._pid = os.getpid()
+        return self._store
+
+    def get(self, key):
+        position = self.positions.get(key)
+        if position is not None:
+            self.positions.move_to_end(key)
+        elif self.store is not None:
+            row = self.store.execute(
+                "SELECT guesses, candidates FROM positions WHERE fingerprint = ? AND strategy = ? AND length = ? "
+                "AND board = ? AND missed = ?", (self.fingerprint, self.strategy) + tuple(key)).fetchone()
+            if row is not None:
+                position = Position(row[0], row[1])
+                self._remember(key, position)
+        if position is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return position
+
+    def put(self, key, guesses, candidates):
+        position = Position("".join(guesses), candidates)
+        self._remember(key, position)
+        if self.store is not None:
+            self.store.execute("INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (self.fingerprint, self.strategy) + tuple(key) + position)
+
+    def _remember(self, key, position):
+        self.positions[key] = position
+        self.positions.move_to_end(key)
+        while len(self.positions) > self.capacity:
+            self.positions.popitem(last=False)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __getstate__(self):
+        # the connection stays behind; a copy opens its own
+        state = self.__dict__.copy()
+        state["_store"] = None
+        state["_pid"] = None
+        return state